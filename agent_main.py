@@ -1,37 +1,79 @@
 import os
+import re
+import sys
 import json
+import hashlib
+import math
+import statistics
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
 from anthropic import Anthropic
 from dotenv import load_dotenv
-from supabase_client import get_supabase_manager, init_supabase
+from supabase_client import (
+    get_supabase_manager, init_supabase, set_report_clock, slack_display_name, slack_user_row,
+    submit_with_report_clock
+)
 
-# Limpiar variables de entorno previas para forzar recarga
-for key in list(os.environ.keys()):
-    if key.startswith(('SLACK_', 'ANTHROPIC_', 'SUPABASE_', 'PROJECT_', 'ENVIRONMENT', 'LOG_LEVEL')):
-        del os.environ[key]
-
-# Cargar variables de entorno
-load_dotenv(override=True)
+# Cargar variables de entorno del .env junto al script (override: el .env manda sobre
+# valores viejos del shell; sin .env, p. ej. en GitHub Actions, se usan las del entorno)
+load_dotenv(dotenv_path=Path(__file__).resolve().parent / '.env', override=True)
 
 # Configuración
 SLACK_TOKEN = os.getenv('SLACK_BOT_TOKEN')
 ANTHROPIC_KEY = os.getenv('ANTHROPIC_API_KEY')
 CHANNEL_ID = os.getenv('PROJECT_CHANNEL_ID')
 LEAD_USER_ID = os.getenv('PROJECT_LEAD_USER_ID')
+# Publicar el reporte en el DM del líder a medida que se genera (chat_update)
+STREAM_REPORT = os.getenv('PULSE_STREAM_REPORT', '').lower() in ('1', 'true', 'yes')
+# Reporte final vía Message Batches API (50% más barato, puede tardar): solo para corridas programadas
+BATCH_FINAL_REPORT = os.getenv('PULSE_BATCH_FINAL_REPORT', '').lower() in ('1', 'true', 'yes')
+# Modelo para las iteraciones con herramientas (vacío: el mismo que redacta el reporte)
+TOOL_MODEL = os.getenv('PULSE_TOOL_MODEL', '')
 
 # Clientes
 slack_client = WebClient(token=SLACK_TOKEN)
+# Reintentar respetando Retry-After cuando Slack responde 429 (paginación, users.info en paralelo)
+slack_client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=3))
 anthropic_client = Anthropic(api_key=ANTHROPIC_KEY)
 
-# Cache de usuarios
+# Cache de usuarios (compartido entre hilos: escrituras protegidas por lock)
 user_cache = {}
+user_cache_lock = threading.Lock()
+
+# Cache local del historial por canal: (channel_id, días hábiles) -> (expira_en, mensajes)
+channel_messages_cache = {}
+CHANNEL_CACHE_TTL_SECONDS = 60
+
+# Metadata de canales: (tipo, channel_id) -> (expira_en, valor)
+channel_info_cache = {}
+CHANNEL_NAME_TTL_SECONDS = 3600
+CHANNEL_MEMBERS_TTL_SECONDS = 600
+
+# Máximo de llamadas users.info simultáneas (respeta el rate limit de Slack)
+MAX_USER_LOOKUPS = 8
+
 
 # ============================================================================
 # FUNCIONES ÚTILES DE main.py
 # ============================================================================
 
+def _user_label(name, username):
+    """Etiqueta "Nombre (@usuario)" internada: un solo string por usuario en todos los mensajes"""
+    return sys.intern(f"{name} (@{username})")
+
+
 def get_user_name(user_id):
     """Obtiene nombre real del usuario (con cache)"""
     if user_id in user_cache:
@@ -40,100 +82,363 @@ def get_user_name(user_id):
     try:
         result = slack_client.users_info(user=user_id)
         user = result.get('user', {})
-        name = user.get('real_name') or user.get('name') or user_id
+        name = slack_display_name(user) if user else user_id
         username = user.get('name', user_id)
 
-        # Si es un bot, usar display_name o bot name
-        if user.get('is_bot'):
-            name = user.get('profile', {}).get('display_name') or user.get('profile', {}).get('real_name') or 'Bot'
-
-        user_cache[user_id] = f"{name} (@{username})"
+        with user_cache_lock:
+            user_cache[sys.intern(user_id)] = _user_label(name, username)
         return user_cache[user_id]
     except Exception as e:
         print(f"⚠️  Error obteniendo usuario {user_id}: {e}")
         return f"Usuario {user_id}"
 
 
-def calculate_business_days(days=7):
-    """Calcula timestamp del inicio de los últimos N días hábiles INCLUYENDO HOY"""
-    current_date = datetime.now()
+def load_user_cache(max_age_minutes=10):
+    """
+    Precarga user_cache para no llamar users.info por cada usuario.
+    Usa la copia persistida en Supabase si es reciente; si no, un solo
+    users.list paginado que se vuelve a persistir para las siguientes ejecuciones.
+    """
+    try:
+        supabase = get_supabase_manager()
+    except Exception as e:
+        print(f"⚠️  Supabase no disponible para cache de usuarios: {e}")
+        supabase = None
+
+    if supabase:
+        cached_users = supabase.get_recent_users(max_age_minutes=max_age_minutes)
+        if cached_users:
+            for row in cached_users:
+                user_cache[sys.intern(row['user_id'])] = _user_label(row['real_name'], row['username'])
+            print(f"👥 {len(cached_users)} usuarios cargados desde Supabase")
+            return len(cached_users)
+
+    users = []
+    cursor = None
+    try:
+        while True:
+            result = slack_client.users_list(limit=1000, cursor=cursor)
+            for user in result.get('members', []):
+                row = slack_user_row(user)
+                if row is None:
+                    continue
+                user_cache[sys.intern(row['user_id'])] = _user_label(row['real_name'], row['username'])
+                users.append(row)
+
+            cursor = result.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                break
+    except SlackApiError as e:
+        print(f"⚠️  Error listando usuarios: {e.response['error']} (se resolverán uno a uno)")
+
+    if supabase and users:
+        supabase.save_users_batch(users)
 
-    # Contar hoy si es día hábil
-    business_days_count = 1 if current_date.weekday() < 5 else 0
+    print(f"👥 {len(users)} usuarios cargados desde Slack")
+    return len(users)
 
-    while business_days_count < days:
-        current_date -= timedelta(days=1)
-        # 0 = Monday, 6 = Sunday
-        if current_date.weekday() < 5:  # Monday to Friday
-            business_days_count += 1
+
+def calculate_business_days(days=7, now=None):
+    """Calcula timestamp del inicio de los últimos N días hábiles INCLUYENDO HOY"""
+    current_date = now or datetime.now()
+    weekday = current_date.weekday()  # 0 = Monday, 6 = Sunday
+
+    if days <= 0:
+        offset = 0
+    elif weekday < 5:
+        # Hoy cuenta como día hábil: faltan days-1 hacia atrás desde hoy
+        full_weeks, extra = divmod(days - 1, 5)
+        offset = full_weeks * 7 + extra + (2 if extra > weekday else 0)
+    else:
+        # Fin de semana: retroceder al viernes, que cuenta como el primero
+        full_weeks, extra = divmod(days - 1, 5)
+        offset = (weekday - 4) + full_weeks * 7 + extra
 
     # Retornar timestamp al inicio del día
-    start_of_day = current_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_day = (current_date - timedelta(days=offset)).replace(hour=0, minute=0, second=0, microsecond=0)
     return start_of_day.timestamp()
 
 
-def get_channel_messages(hours=24):
-    """Obtiene mensajes del canal de los últimos 7 días hábiles desde Slack API"""
-    try:
-        # SIEMPRE obtener de Slack API (fuente de verdad)
-        oldest = calculate_business_days(days=7)
+def iter_channel_history(oldest, page_size=999):
+    """Itera las páginas de conversations.history siguiendo next_cursor"""
+    cursor = None
+    while True:
         result = slack_client.conversations_history(
             channel=CHANNEL_ID,
-            oldest=str(oldest)
+            oldest=str(oldest),
+            cursor=cursor,
+            limit=page_size
         )
+        yield result['messages']
 
-        messages = result['messages']
-        print(f"✅ Obtenidos {len(messages)} mensajes de Slack (últimos 7 días hábiles)")
+        cursor = result.get('response_metadata', {}).get('next_cursor')
+        if not cursor:
+            break
 
-        # Guardar mensajes en Supabase para histórico
-        if messages:
-            try:
-                supabase = get_supabase_manager()
-                saved_count = supabase.save_messages_batch(messages)
-                print(f"💾 Guardados {saved_count} mensajes nuevos en Supabase")
-            except Exception as e:
-                print(f"⚠️  Error guardando en Supabase: {e} (continuando con análisis)")
 
-        return messages
+def get_channel_messages(hours=24):
+    """Obtiene mensajes del canal de los últimos 7 días hábiles desde Slack API"""
+    # Reutilizar el historial si se pidió hace menos de CHANNEL_CACHE_TTL_SECONDS
+    cache_key = (CHANNEL_ID, 7)
+    cached = channel_messages_cache.get(cache_key)
+    if cached and cached[0] > time.monotonic():
+        print(f"♻️  Usando {len(cached[1])} mensajes cacheados del canal")
+        return list(cached[1])
+
+    try:
+        supabase = get_supabase_manager()
+    except Exception as e:
+        print(f"⚠️  Supabase no disponible: {e} (continuando con análisis)")
+        supabase = None
+
+    messages = []
+    saved_count = 0
+    try:
+        # SIEMPRE obtener de Slack API (fuente de verdad), página por página
+        oldest = calculate_business_days(days=7)
+        for page in iter_channel_history(oldest):
+            messages.extend(page)
+
+            # Guardar cada página en Supabase para histórico (un upsert por página)
+            if page and supabase:
+                saved_count += supabase.save_messages_batch(page)
 
     except SlackApiError as e:
         print(f"❌ Error obteniendo mensajes: {e.response['error']}")
         return []
 
+    print(f"✅ Obtenidos {len(messages)} mensajes de Slack (últimos 7 días hábiles)")
+    if supabase:
+        print(f"💾 Guardados {saved_count} mensajes nuevos en Supabase")
+
+    channel_messages_cache[cache_key] = (time.monotonic() + CHANNEL_CACHE_TTL_SECONDS, messages)
+    return list(messages)
+
+
+def _cached_channel_value(key, ttl_seconds, loader):
+    """Devuelve channel_info_cache[key] si no expiró; si no, lo carga (los fallos no se cachean)"""
+    cached = channel_info_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    value = loader()
+    if value is not None:
+        channel_info_cache[key] = (time.monotonic() + ttl_seconds, value)
+    return value
+
+
+def _fetch_channel_name(channel_id):
+    """Nombre del canal (None si Slack no responde)"""
+    try:
+        return slack_client.conversations_info(channel=channel_id)['channel']['name']
+    except SlackApiError as e:
+        print(f"⚠️  No se pudo obtener nombre del canal: {e.response['error']}")
+    except Exception as e:
+        print(f"⚠️  No se pudo obtener nombre del canal: {e}")
+    return None
+
+
+def _fetch_member_count(channel_id):
+    """Total de miembros del canal (None si Slack no responde)"""
+    try:
+        return len(slack_client.conversations_members(channel=channel_id)['members'])
+    except Exception as e:
+        print(f"⚠️  No se pudo obtener miembros del canal: {e}")
+        return None
+
+
+def get_channel_name(channel_id):
+    """Nombre del canal; casi nunca cambia, así que se cachea por CHANNEL_NAME_TTL_SECONDS"""
+    name = _cached_channel_value(('name', channel_id), CHANNEL_NAME_TTL_SECONDS,
+                                 lambda: _fetch_channel_name(channel_id))
+    return name or "proyecto"
+
+
+def get_channel_member_count(channel_id):
+    """Total de miembros del canal (None si no se pudo obtener)"""
+    return _cached_channel_value(('members', channel_id), CHANNEL_MEMBERS_TTL_SECONDS,
+                                 lambda: _fetch_member_count(channel_id))
+
+
+class EnrichedMessage(NamedTuple):
+    """Mensaje de Slack con nombre resuelto (tupla liviana en vez de dict)"""
+    user_id: str
+    user_name: str
+    text: str
+    ts: str
+
+    def get(self, key, default=None):
+        """Acceso estilo dict: las herramientas también reciben mensajes como JSON"""
+        return getattr(self, key) if key in self._fields else default
+
 
 def enrich_messages_with_names(messages):
-    """Añade nombres reales a los mensajes"""
+    """Añade nombres reales a los mensajes (un EnrichedMessage por mensaje de usuario)"""
+    # Resolver en paralelo los usuarios que no estén en cache (users.info es I/O puro)
+    missing = {msg['user'] for msg in messages if 'user' in msg} - user_cache.keys()
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(MAX_USER_LOOKUPS, len(missing))) as executor:
+            list(executor.map(get_user_name, missing))
+
     enriched = []
     for msg in messages:
         if 'user' in msg:
-            user_name = get_user_name(msg['user'])
-            enriched.append({
-                'user_id': msg['user'],
-                'user_name': user_name,
-                'text': msg.get('text', ''),
-                'ts': msg['ts']
-            })
+            user_id = sys.intern(msg['user'])
+            enriched.append(EnrichedMessage(
+                user_id=user_id,
+                user_name=get_user_name(user_id),
+                text=msg.get('text', ''),
+                ts=msg['ts']
+            ))
     return enriched
 
 
+# Avisos automáticos de Slack al unirse alguien al canal
+_JOIN_RE = re.compile(r"se ha unido al canal|has joined", re.IGNORECASE)
+
+
+@dataclass
+class MessageStats:
+    """Métricas del canal calculadas en una sola pasada; las comparten el análisis y el reporte"""
+    real_messages: list = field(default_factory=list)
+    messages_per_user: Counter = field(default_factory=Counter)
+    collaborative_count: int = 0
+
+    @property
+    def active_users(self):
+        """Usuarios con al menos un mensaje real (las claves del conteo)"""
+        return set(self.messages_per_user)
+
+    def top_contributors(self, n=5):
+        """[(nombre, mensajes)] de los n usuarios más activos"""
+        return [(user_cache.get(user_id, user_id), count)
+                for user_id, count in self.messages_per_user.most_common(n)]
+
+
+def summarize_messages(enriched_messages):
+    """Filtra mensajes reales (no automáticos) y acumula sus métricas en un solo recorrido"""
+    stats = MessageStats()
+    for msg in enriched_messages:
+        text = msg.text
+        # El corte por longitud (barato) va antes que el regex de mensajes de sistema
+        if not text or len(text) <= 15 or _JOIN_RE.search(text):
+            continue
+
+        stats.real_messages.append(msg)
+        stats.messages_per_user[msg.user_id] += 1
+        # Mensajes colaborativos (con menciones o respuestas; '<@' ya contiene '@')
+        if '@' in text:
+            stats.collaborative_count += 1
+    return stats
+
+
+# ============================================================================
+# KEYWORDS DE ANÁLISIS
+# ============================================================================
+
+# Tabla única para plegar acentos tras .lower(): "critico" y "crítico" coinciden
+ACCENT_TABLE = str.maketrans('áéíóúüñ', 'aeiouun')
+
+
+def normalize_text(text):
+    """Minúsculas sin acentos: forma canónica contra la que se comparan las keywords"""
+    return text.lower().translate(ACCENT_TABLE)
+
+
+def _compile_keywords(keywords):
+    """Compila una lista de keywords (normalizadas igual que el texto) en un único patrón de búsqueda"""
+    return re.compile('|'.join(re.escape(normalize_text(kw)) for kw in keywords))
+
+
+# Cada familia se compila una sola vez: un escaneo por mensaje en vez de un `in` por keyword
+FRUSTRATION_KEYWORDS = ('frustrado', 'molesto', 'no funciona', 'otra vez', 'no puedo',
+                        'bloqueado', 'stuck', 'no avanza', 'cansado', 'harto')
+ENTHUSIASM_KEYWORDS = ('genial', 'excelente', 'perfecto', 'listo', 'completado',
+                       'funciona', 'logré', 'conseguí', 'awesome', 'great', '🎉', '✅')
+CONCERN_KEYWORDS = ('preocupa', 'problema', 'riesgo', 'urgente', 'crítico',
+                    'atrasado', 'retraso', 'concerned', 'worried', 'issue')
+BLOCKER_KEYWORDS = ('bloqueado', 'blocked', 'stuck', 'esperando', 'waiting',
+                    'no puedo avanzar', 'necesito que', 'dependiendo de')
+UNBLOCK_KEYWORDS = ('puedo ayudar', 'lo reviso', 'me encargo', 'ya lo hago',
+                    'te desbloqueo', 'listo', 'resuelto')
+DECISION_KEYWORDS = ('decidimos', 'vamos a', 'haremos', 'acordamos', 'decided to',
+                     'we will', 'we are going to', 'agreed to')
+QUESTION_KEYWORDS = ('?', 'deberíamos', 'qué hacemos con', 'should we')
+
+# Familias de sentimiento: (clave en breakdown, etiqueta, patrón)
+SENTIMENT_PATTERNS = (
+    ('frustration', 'frustración', _compile_keywords(FRUSTRATION_KEYWORDS)),
+    ('enthusiasm', 'entusiasmo', _compile_keywords(ENTHUSIASM_KEYWORDS)),
+    ('concern', 'preocupación', _compile_keywords(CONCERN_KEYWORDS)),
+)
+# Orden de desempate del tono dominante (mismo orden que sentiment_breakdown)
+SENTIMENT_PRIORITY = {'frustration': 0, 'enthusiasm': 1, 'concern': 2, 'neutral': 3}
+
+# Keyword normalizada -> forma original, para reportar la palabra tal como está en la lista
+KEYWORD_DISPLAY = {
+    normalize_text(kw): kw
+    for kw in FRUSTRATION_KEYWORDS + ENTHUSIASM_KEYWORDS + CONCERN_KEYWORDS
+}
+BLOCKER_RE = _compile_keywords(BLOCKER_KEYWORDS)
+UNBLOCK_RE = _compile_keywords(UNBLOCK_KEYWORDS)
+DECISION_RE = _compile_keywords(DECISION_KEYWORDS)
+QUESTION_RE = _compile_keywords(QUESTION_KEYWORDS)
+
+# Indicadores de urgencia por nivel (el orden dentro de cada tupla es la prioridad del reporte)
+CRITICAL_INDICATORS = ('cliente afectado', 'producción caída', 'perdiendo dinero',
+                       'deadline hoy', 'client down', 'production down')
+HIGH_INDICATORS = ('deadline esta semana', 'cliente preguntando', 'bloqueando a otros',
+                   'urgente', 'asap', 'prioritario', 'critical')
+MEDIUM_INDICATORS = ('deadline próximo', 'importante', 'deberíamos', 'hay que')
+LOW_INDICATORS = ('cuando puedas', 'no urgente', 'eventualmente', 'nice to have')
+
+CRITICAL_RE = _compile_keywords(CRITICAL_INDICATORS)
+HIGH_RE = _compile_keywords(HIGH_INDICATORS)
+MEDIUM_RE = _compile_keywords(MEDIUM_INDICATORS)
+LOW_RE = _compile_keywords(LOW_INDICATORS)
+
+# Cualquier señal que pueda subir la urgencia o aportar razonamiento; sin coincidencia -> respuesta fija
+URGENCY_SIGNAL_RE = _compile_keywords(
+    CRITICAL_INDICATORS + HIGH_INDICATORS + MEDIUM_INDICATORS + LOW_INDICATORS
+    + ('deadline', 'fecha límite', 'client')
+)
+NO_URGENCY = ('bajo', 25, ("Sin indicadores claros de urgencia",))
+
+# (nivel, score, patrón, indicadores, impacto); el nivel bajo no cambia el score, solo lo explica
+URGENCY_LEVELS = (
+    ('crítico', 100, CRITICAL_RE, CRITICAL_INDICATORS, 'impacto inmediato'),
+    ('alto', 75, HIGH_RE, HIGH_INDICATORS, 'requiere atención pronta'),
+    ('medio', 50, MEDIUM_RE, MEDIUM_INDICATORS, 'planificar pronto'),
+    ('bajo', 25, LOW_RE, LOW_INDICATORS, 'sin presión temporal'),
+)
+
+# Cuántos ejemplos se devuelven al agente (los conteos siempre son totales)
+MAX_DETECTED_KEYWORDS = 10
+MAX_DECISIONS = 5
+
+
 # ============================================================================
 # HERRAMIENTAS PARA EL AGENTE
 # ============================================================================
 
+def _text_lower(msg):
+    """Texto normalizado de un mensaje (siempre desde 'text': no se confía en un plegado hecho por el modelo)"""
+    if isinstance(msg, str):
+        return normalize_text(msg)
+    return normalize_text(msg.get('text', ''))
+
+
+def _lowered_messages(messages):
+    """Empareja cada mensaje enriquecido con su texto normalizado (ignora strings sueltos)"""
+    return ((msg, _text_lower(msg)) for msg in messages if not isinstance(msg, str))
+
+
 def analyze_sentiment(messages):
     """
     Analiza el tono emocional del equipo en los mensajes.
     Retorna score 0-100 y palabras clave detectadas.
     """
     try:
-        # Keywords por categoría emocional
-        frustration_keywords = ['frustrado', 'molesto', 'no funciona', 'otra vez', 'no puedo',
-                                'bloqueado', 'stuck', 'no avanza', 'cansado', 'harto']
-        enthusiasm_keywords = ['genial', 'excelente', 'perfecto', 'listo', 'completado',
-                               'funciona', 'logré', 'conseguí', 'awesome', 'great', '🎉', '✅']
-        concern_keywords = ['preocupa', 'problema', 'riesgo', 'urgente', 'crítico',
-                           'atrasado', 'retraso', 'concerned', 'worried', 'issue']
-
         sentiment_scores = {
             'frustration': 0,
             'enthusiasm': 0,
@@ -142,7 +447,29 @@ def analyze_sentiment(messages):
         }
 
         detected_keywords = []
-        total_messages = len(messages)
+
+        # Tono dominante llevado durante el escaneo; en empate gana el primero del breakdown
+        dominant = 'frustration'
+        dominant_rank = (0, 0)
+
+        # Una sola pasada sobre el iterable (acepta strings o mensajes enriquecidos)
+        total_messages = 0
+        for text in map(_text_lower, messages):
+            total_messages += 1
+            hits = []
+            for category, label, pattern in SENTIMENT_PATTERNS:
+                match = pattern.search(text)
+                if match:
+                    hits.append(category)
+                    # Solo se guardan las primeras MAX_DETECTED_KEYWORDS; el resto solo cuenta
+                    if len(detected_keywords) < MAX_DETECTED_KEYWORDS:
+                        detected_keywords.append((label, KEYWORD_DISPLAY[match.group(0)]))
+
+            for category in hits or ('neutral',):
+                sentiment_scores[category] += 1
+                rank = (sentiment_scores[category], -SENTIMENT_PRIORITY[category])
+                if rank > dominant_rank:
+                    dominant, dominant_rank = category, rank
 
         if total_messages == 0:
             return {
@@ -152,38 +479,6 @@ def analyze_sentiment(messages):
                 'summary': 'Sin mensajes para analizar'
             }
 
-        for msg in messages:
-            text = msg.lower() if isinstance(msg, str) else msg.get('text', '').lower()
-
-            has_sentiment = False
-
-            # Detectar frustración
-            for kw in frustration_keywords:
-                if kw in text:
-                    sentiment_scores['frustration'] += 1
-                    detected_keywords.append(('frustración', kw))
-                    has_sentiment = True
-                    break
-
-            # Detectar entusiasmo
-            for kw in enthusiasm_keywords:
-                if kw in text:
-                    sentiment_scores['enthusiasm'] += 1
-                    detected_keywords.append(('entusiasmo', kw))
-                    has_sentiment = True
-                    break
-
-            # Detectar preocupación
-            for kw in concern_keywords:
-                if kw in text:
-                    sentiment_scores['concern'] += 1
-                    detected_keywords.append(('preocupación', kw))
-                    has_sentiment = True
-                    break
-
-            if not has_sentiment:
-                sentiment_scores['neutral'] += 1
-
         # Calcular score general (0-100)
         # Fórmula: entusiasmo suma, frustración/preocupación restan
         positive = sentiment_scores['enthusiasm']
@@ -196,13 +491,12 @@ def analyze_sentiment(messages):
             score = 50
 
         # Crear resumen
-        dominant = max(sentiment_scores, key=sentiment_scores.get)
         summary = f"Tono predominante: {dominant} ({sentiment_scores[dominant]}/{total_messages} mensajes)"
 
         return {
             'overall_score': round(score, 1),
             'sentiment_breakdown': sentiment_scores,
-            'detected_keywords': detected_keywords[:10],  # Top 10
+            'detected_keywords': detected_keywords,  # Top 10
             'summary': summary
         }
 
@@ -222,26 +516,17 @@ def detect_blockers(messages):
     Detecta quién está bloqueado, por qué, y quién puede desbloquearlo.
     """
     try:
-        blocker_keywords = ['bloqueado', 'blocked', 'stuck', 'esperando', 'waiting',
-                           'no puedo avanzar', 'necesito que', 'dependiendo de']
-        unblock_keywords = ['puedo ayudar', 'lo reviso', 'me encargo', 'ya lo hago',
-                           'te desbloqueo', 'listo', 'resuelto']
-
         blockers = []
+        unblockers = []
 
-        for msg in messages:
-            if isinstance(msg, str):
-                continue
-
-            text = msg.get('text', '').lower()
+        # Una sola pasada: cada mensaje se evalúa contra bloqueo y desbloqueo
+        for msg, text in _lowered_messages(messages):
             user_name = msg.get('user_name', 'Unknown')
 
             # Detectar bloqueo
-            is_blocked = any(kw in text for kw in blocker_keywords)
-
-            if is_blocked:
+            if BLOCKER_RE.search(text) is not None:
                 # Intentar extraer razón del bloqueo
-                reason = text[:150]
+                reason = msg.get('text', '')[:150].lower()
 
                 # Intentar detectar quién puede desbloquear (menciones)
                 blocked_by = None
@@ -260,21 +545,11 @@ def detect_blockers(messages):
                     'timestamp': msg.get('ts', 'unknown')
                 })
 
-        # Detectar intentos de desbloqueo
-        unblockers = []
-        for msg in messages:
-            if isinstance(msg, str):
-                continue
-
-            text = msg.get('text', '').lower()
-            user_name = msg.get('user_name', 'Unknown')
-
-            is_unblocking = any(kw in text for kw in unblock_keywords)
-
-            if is_unblocking:
+            # Detectar intentos de desbloqueo
+            if UNBLOCK_RE.search(text) is not None:
                 unblockers.append({
                     'who_helps': user_name,
-                    'context': text[:100]
+                    'context': msg.get('text', '')[:100].lower()
                 })
 
         return {
@@ -294,83 +569,66 @@ def detect_blockers(messages):
         }
 
 
-def classify_urgency(context):
+def _first_indicator(indicators, text):
+    """Primer indicador de la lista (en orden de prioridad) presente en el texto"""
+    return next(indicator for indicator in indicators if normalize_text(indicator) in text)
+
+
+@lru_cache(maxsize=4096)
+def _classify_urgency_cached(context):
     """
     Evalúa nivel de urgencia REAL basado en contexto.
     Considera: impacto en clientes, deadlines, dependencias.
+    Función pura: devuelve (urgency_level, score, reasoning) inmutable para cachear por contexto.
     """
-    try:
-        context_lower = context.lower()
+    context_lower = normalize_text(context)
 
-        # Indicadores de urgencia crítica
-        critical_indicators = ['cliente afectado', 'producción caída', 'perdiendo dinero',
-                              'deadline hoy', 'client down', 'production down']
+    # Camino rápido: textos sin ninguna señal (vacíos, saludos, updates rutinarios)
+    if URGENCY_SIGNAL_RE.search(context_lower) is None:
+        return NO_URGENCY
 
-        # Indicadores de urgencia alta
-        high_indicators = ['deadline esta semana', 'cliente preguntando', 'bloqueando a otros',
-                          'urgente', 'asap', 'prioritario', 'critical']
+    urgency_level = 'bajo'
+    score = 25
+    reasoning = []
 
-        # Indicadores de urgencia media
-        medium_indicators = ['deadline próximo', 'importante', 'deberíamos', 'hay que']
+    # Evaluar en orden de prioridad: el primer nivel con coincidencia gana
+    for level, level_score, pattern, indicators, impact in URGENCY_LEVELS:
+        if pattern.search(context_lower):
+            indicator = _first_indicator(indicators, context_lower)
+            urgency_level = level
+            score = level_score
+            reasoning.append(f"Detectado: '{indicator}' - {impact}")
+            break
 
-        # Indicadores de urgencia baja
-        low_indicators = ['cuando puedas', 'no urgente', 'eventualmente', 'nice to have']
+    # Detectar deadlines explícitos
+    if 'deadline' in context_lower or 'fecha limite' in context_lower:
+        reasoning.append("Deadline explícito mencionado")
+        if score < 75:
+            score = 75
+            urgency_level = 'alto'
 
-        urgency_level = 'bajo'
-        score = 25
-        reasoning = []
+    # Detectar impacto en clientes
+    if 'cliente' in context_lower or 'client' in context_lower:
+        reasoning.append("Impacto en clientes mencionado")
+        if score < 75:
+            score = 75
+            urgency_level = 'alto'
 
-        # Evaluar en orden de prioridad
-        for indicator in critical_indicators:
-            if indicator in context_lower:
-                urgency_level = 'crítico'
-                score = 100
-                reasoning.append(f"Detectado: '{indicator}' - impacto inmediato")
-                break
+    if not reasoning:
+        reasoning.append("Sin indicadores claros de urgencia")
 
-        if urgency_level != 'crítico':
-            for indicator in high_indicators:
-                if indicator in context_lower:
-                    urgency_level = 'alto'
-                    score = 75
-                    reasoning.append(f"Detectado: '{indicator}' - requiere atención pronta")
-                    break
-
-        if urgency_level not in ['crítico', 'alto']:
-            for indicator in medium_indicators:
-                if indicator in context_lower:
-                    urgency_level = 'medio'
-                    score = 50
-                    reasoning.append(f"Detectado: '{indicator}' - planificar pronto")
-                    break
-
-        if urgency_level == 'bajo':
-            for indicator in low_indicators:
-                if indicator in context_lower:
-                    reasoning.append(f"Detectado: '{indicator}' - sin presión temporal")
-                    break
-
-        # Detectar deadlines explícitos
-        if 'deadline' in context_lower or 'fecha límite' in context_lower:
-            reasoning.append("Deadline explícito mencionado")
-            if score < 75:
-                score = 75
-                urgency_level = 'alto'
-
-        # Detectar impacto en clientes
-        if 'cliente' in context_lower or 'client' in context_lower:
-            reasoning.append("Impacto en clientes mencionado")
-            if score < 75:
-                score = 75
-                urgency_level = 'alto'
-
-        if not reasoning:
-            reasoning.append("Sin indicadores claros de urgencia")
+    return urgency_level, score, tuple(reasoning)
+
+
+def classify_urgency(context):
+    """Clasifica urgencia de un contexto (cacheado por texto exacto)"""
+    try:
+        urgency_level, score, reasoning = _classify_urgency_cached(context)
 
         return {
             'urgency_level': urgency_level,
             'score': score,
-            'reasoning': reasoning,
+            'reasoning': list(reasoning),
             'summary': f"Urgencia {urgency_level.upper()} (score: {score}/100)"
         }
 
@@ -384,6 +642,28 @@ def classify_urgency(context):
         }
 
 
+classify_urgency.cache_info = _classify_urgency_cached.cache_info
+
+
+# Umbrales de score y su estado correspondiente (de peor a mejor)
+HEALTH_THRESHOLDS = (40, 60, 80)
+HEALTH_STATUS = (
+    ('CRÍTICO', '🔴'),
+    ('REGULAR', '🟠'),
+    ('BUENO', '🟡'),
+    ('EXCELENTE', '🟢'),
+)
+
+
+def _as_count(value):
+    """Convierte un conteo (int, float o string) a float; 0 si no es numérico"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+
 def calculate_team_health(team_data):
     """
     Calcula score 0-100 de salud del equipo.
@@ -427,23 +707,15 @@ def calculate_team_health(team_data):
         # Asegurar que sea una lista
         if not isinstance(messages_per_user, list):
             messages_per_user = []
+        messages_per_user = [x for x in map(_as_count, messages_per_user) if x >= 0]
         if len(messages_per_user) > 1:
-            import statistics
-            # Convertir a números (en caso de que vengan strings)
-            messages_per_user = [float(x) if isinstance(x, (int, float, str)) and str(x).replace('.','').replace('-','').isdigit() else 0 for x in messages_per_user]
-            # Filtrar valores válidos
-            messages_per_user = [x for x in messages_per_user if x >= 0]
-
-            if len(messages_per_user) > 1:
-                mean = statistics.mean(messages_per_user)
-                stdev = statistics.stdev(messages_per_user)
-                cv = (stdev / mean) if mean > 0 else 0
-                # CV bajo = buena distribución (score alto)
-                # CV > 1 = distribución muy desigual (score bajo)
-                distribution_score = max(0, 100 - (cv * 50))
-                health_components['workload_distribution'] = distribution_score
-            else:
-                health_components['workload_distribution'] = 50
+            mean = statistics.fmean(messages_per_user)
+            stdev = statistics.stdev(messages_per_user, mean)
+            cv = (stdev / mean) if mean > 0 else 0
+            # CV bajo = buena distribución (score alto)
+            # CV > 1 = distribución muy desigual (score bajo)
+            distribution_score = max(0, 100 - (cv * 50))
+            health_components['workload_distribution'] = distribution_score
         else:
             health_components['workload_distribution'] = 50
 
@@ -469,18 +741,7 @@ def calculate_team_health(team_data):
         )
 
         # Determinar estado
-        if total_score >= 80:
-            status = 'EXCELENTE'
-            emoji = '🟢'
-        elif total_score >= 60:
-            status = 'BUENO'
-            emoji = '🟡'
-        elif total_score >= 40:
-            status = 'REGULAR'
-            emoji = '🟠'
-        else:
-            status = 'CRÍTICO'
-            emoji = '🔴'
+        status, emoji = HEALTH_STATUS[bisect_right(HEALTH_THRESHOLDS, total_score)]
 
         return {
             'overall_score': round(total_score, 1),
@@ -507,25 +768,23 @@ def extract_key_decisions(messages):
     Retorna: qué se decidió, quién lo decidió, por qué, y próximos pasos.
     """
     try:
-        decision_indicators = ['decidimos', 'vamos a', 'haremos', 'acordamos', 'decided to',
-                              'we will', 'we are going to', 'agreed to']
-        question_indicators = ['?', 'deberíamos', 'qué hacemos con', 'should we']
-
         decisions_made = []
         decisions_pending = []
+        total_made = 0
+        total_pending = 0
 
-        for msg in messages:
-            if isinstance(msg, str):
-                continue
-
+        for msg, text_lower in _lowered_messages(messages):
             text = msg.get('text', '')
-            text_lower = text.lower()
             user_name = msg.get('user_name', 'Unknown')
 
             # Detectar decisión tomada
-            has_decision = any(indicator in text_lower for indicator in decision_indicators)
+            has_decision = DECISION_RE.search(text_lower) is not None
 
             if has_decision:
+                total_made += 1
+
+            # Solo se arma el detalle de las primeras MAX_DECISIONS
+            if has_decision and len(decisions_made) < MAX_DECISIONS:
                 # Intentar extraer "por qué"
                 reasoning = None
                 if 'porque' in text_lower or 'ya que' in text_lower or 'because' in text_lower:
@@ -545,21 +804,23 @@ def extract_key_decisions(messages):
                 })
 
             # Detectar decisión pendiente (pregunta)
-            has_question = any(indicator in text_lower for indicator in question_indicators)
+            has_question = QUESTION_RE.search(text_lower) is not None
 
             if has_question and not has_decision:
-                decisions_pending.append({
-                    'what': text[:150],
-                    'who_asks': user_name,
-                    'timestamp': msg.get('ts', 'unknown')
-                })
+                total_pending += 1
+                if len(decisions_pending) < MAX_DECISIONS:
+                    decisions_pending.append({
+                        'what': text[:150],
+                        'who_asks': user_name,
+                        'timestamp': msg.get('ts', 'unknown')
+                    })
 
         return {
-            'total_decisions_made': len(decisions_made),
-            'total_decisions_pending': len(decisions_pending),
-            'decisions_made': decisions_made[:5],  # Top 5
-            'decisions_pending': decisions_pending[:5],  # Top 5
-            'summary': f"Decisiones tomadas: {len(decisions_made)}, Pendientes: {len(decisions_pending)}"
+            'total_decisions_made': total_made,
+            'total_decisions_pending': total_pending,
+            'decisions_made': decisions_made,  # Top 5
+            'decisions_pending': decisions_pending,  # Top 5
+            'summary': f"Decisiones tomadas: {total_made}, Pendientes: {total_pending}"
         }
 
     except Exception as e:
@@ -647,7 +908,9 @@ TOOLS = [
                 }
             },
             "required": ["messages"]
-        }
+        },
+        # Breakpoint de prompt caching: cachea la definición de todas las herramientas
+        "cache_control": {"type": "ephemeral"}
     }
 ]
 
@@ -682,75 +945,32 @@ def process_tool_call(tool_name, tool_input):
         return {"error": str(e)}
 
 
-# ============================================================================
-# LOOP AGÉNTICO
-# ============================================================================
+def serialize_tool_result(result):
+    """Serializa el resultado de una herramienta una sola vez, en JSON compacto (menos bytes y tokens)"""
+    return json.dumps(result, ensure_ascii=False, separators=(',', ':'))
 
-def run_agentic_analysis(enriched_messages):
+
+def process_tool_calls(tool_calls):
     """
-    Ejecuta el loop agéntico con Claude.
-    Claude usa las herramientas para analizar los mensajes y generar un reporte.
+    Ejecuta varias herramientas solicitadas en un mismo turno.
+    Son independientes entre sí, así que corren en paralelo; los resultados
+    se devuelven en el mismo orden que tool_calls [(nombre, input), ...].
     """
-    try:
-        # Preparar contexto inicial
-        channel_name = "proyecto"
-        try:
-            channel_info = slack_client.conversations_info(channel=CHANNEL_ID)
-            channel_name = channel_info['channel']['name']
-        except Exception as e:
-            print(f"⚠️  No se pudo obtener nombre del canal: {e}")
-
-        # Filtrar mensajes reales (no automáticos)
-        real_messages = []
-        for msg in enriched_messages:
-            text = msg.get('text', '')
-            if (text and
-                'se ha unido al canal' not in text.lower() and
-                'has joined' not in text.lower() and
-                len(text) > 15):
-                real_messages.append(msg)
-
-        if not real_messages:
-            return None
-
-        # Preparar datos del equipo para análisis
-        active_users = set(m['user_id'] for m in real_messages)
-
-        # Obtener total de miembros
-        try:
-            channel_members = slack_client.conversations_members(channel=CHANNEL_ID)
-            total_members = len(channel_members['members'])
-        except:
-            total_members = len(active_users)
+    if len(tool_calls) <= 1:
+        return [process_tool_call(name, tool_input) for name, tool_input in tool_calls]
 
-        # Contar mensajes por usuario
-        messages_per_user = {}
-        for msg in real_messages:
-            user_id = msg['user_id']
-            messages_per_user[user_id] = messages_per_user.get(user_id, 0) + 1
+    max_workers = min(len(tool_calls), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda call: process_tool_call(*call), tool_calls))
 
-        # Mensajes colaborativos (con menciones o respuestas)
-        collaborative_messages = sum(1 for m in real_messages if '<@' in m.get('text', '') or '@' in m.get('text', ''))
 
-        # Preparar conversaciones para el contexto
-        conversations = []
-        for msg in real_messages[:50]:  # Limitar a últimos 50 para no exceder tokens
-            conversations.append(f"*{msg['user_name']}*: {msg['text']}")
-        message_context = "\n".join(conversations)
-
-        # Prompt inicial para Claude
-        initial_prompt = f"""Eres un analista ejecutivo experto. Analiza la actividad del canal #{channel_name} de los últimos 7 días hábiles.
-
-DATOS DEL CANAL:
-----------
-Total mensajes: {len(real_messages)}
-Usuarios activos: {len(active_users)}
-Total miembros: {total_members}
+# ============================================================================
+# LOOP AGÉNTICO
+# ============================================================================
 
-CONVERSACIONES RECIENTES:
-----------
-{message_context}
-----------
+# Instrucciones fijas del análisis: van primero y marcadas con cache_control para que
+# Anthropic reutilice el prefijo (herramientas + instrucciones) en cada iteración
+ANALYSIS_INSTRUCTIONS = """Eres un analista ejecutivo experto. Al final de este mensaje tienes la actividad de un canal de Slack.
 
 TU TAREA:
 1. USA LAS HERRAMIENTAS disponibles para analizar los mensajes en detalle
@@ -819,48 +1039,253 @@ REGLAS ESTRICTAS:
 - NO inventes información, usa solo lo detectado por las herramientas
 - Sé conciso pero completo"""
 
-        # Iniciar conversación con Claude
-        messages = [{"role": "user", "content": initial_prompt}]
 
-        print("🤖 Iniciando análisis agéntico con Claude...")
+def _conversation_context(messages, max_messages=50, max_chars=12000):
+    """
+    Últimos mensajes para el prompt (Slack los entrega del más nuevo al más viejo).
+    Se corta por cantidad y por caracteres para acotar los tokens de entrada.
+    """
+    lines = []
+    total_chars = 0
+    for msg in islice(messages, max_messages):
+        line = f"*{msg.user_name}*: {msg.text}"
+        total_chars += len(line) + 1
+        if lines and total_chars > max_chars:
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+
+# Parte variable del prompt; se rellena con str.format en cada corrida
+CHANNEL_DATA_TEMPLATE = """Analiza la actividad del canal #{channel_name} de los últimos 7 días hábiles.
+
+DATOS DEL CANAL:
+----------
+Total mensajes: {total_messages}
+Usuarios activos: {active_users}
+Total miembros: {total_members}
+Mensajes colaborativos (con menciones): {collaborative_messages}
+Mensajes por usuario (top 5): {top_contributors}
+
+CONVERSACIONES RECIENTES:
+----------
+{message_context}
+----------"""
+
+# Modelos: Sonnet por defecto; canales chicos y con pocos participantes alcanzan con Haiku
+ANALYSIS_MODEL = "claude-sonnet-4-20250514"
+LIGHT_ANALYSIS_MODEL = "claude-haiku-4-5-20251001"
+LIGHT_MAX_MESSAGES = 20
+LIGHT_MAX_USERS = 3
+
+
+def select_model(stats):
+    """Elige el modelo según el tamaño del canal a analizar"""
+    if len(stats.real_messages) < LIGHT_MAX_MESSAGES and len(stats.messages_per_user) <= LIGHT_MAX_USERS:
+        return LIGHT_ANALYSIS_MODEL
+    return ANALYSIS_MODEL
+
+
+# Cada cuánto se consulta el estado del batch del reporte final, y cuánto se lo espera
+# como máximo (un batch puede tardar hasta 24h; el job de Actions corta mucho antes)
+BATCH_POLL_SECONDS = 30
+BATCH_MAX_WAIT_SECONDS = 30 * 60
+
+
+def _final_report_params(messages, model):
+    """Pedido del reporte final sobre la conversación ya resuelta (sin más herramientas)"""
+    return {
+        "model": model,
+        "max_tokens": 4096,
+        "tools": TOOLS,
+        "tool_choice": {"type": "none"},
+        "messages": messages
+    }
+
+
+def generate_report_via_batch(messages, model=ANALYSIS_MODEL):
+    """
+    Genera el reporte final con la Message Batches API a partir de la conversación
+    ya resuelta (herramientas incluidas). Devuelve el texto o None si el batch falla
+    o no termina en BATCH_MAX_WAIT_SECONDS (en ese caso se cancela).
+    """
+    batch = anthropic_client.messages.batches.create(requests=[{
+        "custom_id": "pulse-report",
+        "params": _final_report_params(messages, model)
+    }])
+    print(f"📦 Reporte final enviado como batch {batch.id}, esperando resultado...")
+
+    deadline = time.monotonic() + BATCH_MAX_WAIT_SECONDS
+    while batch.processing_status != "ended":
+        if time.monotonic() >= deadline:
+            print(f"⚠️  El batch {batch.id} no terminó en {BATCH_MAX_WAIT_SECONDS // 60} min, se cancela")
+            try:
+                anthropic_client.messages.batches.cancel(batch.id)
+            except Exception as e:
+                print(f"⚠️  No se pudo cancelar el batch: {e}")
+            return None
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = anthropic_client.messages.batches.retrieve(batch.id)
+
+    for entry in anthropic_client.messages.batches.results(batch.id):
+        if entry.result.type == "succeeded":
+            return "".join(block.text for block in entry.result.message.content if block.type == "text")
+        print(f"❌ El batch terminó sin reporte: {entry.result.type}")
+    return None
+
+
+def generate_final_report(messages, model=ANALYSIS_MODEL):
+    """Reporte final: vía batch y, si no hay resultado, con una llamada sincrónica"""
+    report = generate_report_via_batch(messages, model)
+    if report:
+        return report
+
+    print("⚠️  Batch sin resultado, generando el reporte en forma sincrónica")
+    response = anthropic_client.messages.create(**_final_report_params(messages, model))
+    return "".join(block.text for block in response.content if block.type == "text") or None
+
+
+# Tokens de salida por turno del loop; si una llamada a herramienta se corta, se reintenta una vez con más
+ANALYSIS_MAX_TOKENS = 4096
+ANALYSIS_RETRY_MAX_TOKENS = 8192
+
+# Cuántas veces se tolera la misma llamada a herramienta antes de forzar el cierre
+MAX_REPEATED_TOOL_CALLS = 2
+FINALIZE_PROMPT = "Ya tienes estos resultados. Finaliza el reporte ahora con la información disponible, sin usar más herramientas."
+
+# Con un turno de reporte aparte (streaming, batch o modelo de herramientas distinto) la fase de herramientas
+# cierra con una señal corta y el reporte se pide en un turno sin herramientas (se genera una vez)
+TOOLS_PHASE_PROMPT = "Primero usa las herramientas para reunir los datos. Cuando tengas todo lo necesario responde solo LISTO, sin el reporte: te lo pediré en el siguiente mensaje."
+REPORT_PROMPT = "Escribe ahora el reporte final con la información reunida, sin usar más herramientas."
+# Un cierre de la fase de herramientas más largo que esto ya es el reporte (el modelo lo escribió igual)
+TOOLS_PHASE_DONE_MAX_CHARS = 200
+
+
+def _tool_call_key(name, tool_input):
+    """Huella corta de una llamada a herramienta (nombre + input canónico)"""
+    payload = f"{name}:{json.dumps(tool_input, sort_keys=True, ensure_ascii=False)}"
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+
+def run_agentic_analysis(stats, channel_name, total_members, streamer=None):
+    """
+    Ejecuta el loop agéntico con Claude.
+    Claude usa las herramientas para analizar los mensajes y generar un reporte.
+    Con un ReportStreamer, el texto se va publicando en Slack mientras llega.
+    """
+    try:
+        # Mensajes reales y métricas (ya calculados en summarize_messages)
+        real_messages = stats.real_messages
+        if not real_messages:
+            return None
+
+        active_users = stats.active_users
+
+        # Total de miembros (si Slack no respondió, al menos los activos)
+        if total_members is None:
+            total_members = len(active_users)
+
+        # Preparar conversaciones para el contexto (acotado en mensajes y caracteres)
+        message_context = _conversation_context(real_messages)
+
+        top_contributors = ", ".join(f"{name}: {count}" for name, count in stats.top_contributors())
+
+        # Datos del canal: la única parte del prompt que cambia entre ejecuciones
+        channel_data = CHANNEL_DATA_TEMPLATE.format(
+            channel_name=channel_name,
+            total_messages=len(real_messages),
+            active_users=len(active_users),
+            total_members=total_members,
+            collaborative_messages=stats.collaborative_count,
+            top_contributors=top_contributors,
+            message_context=message_context
+        )
+
+        # Iniciar conversación con Claude: instrucciones fijas (cacheadas) + datos del canal
+        messages = [{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": ANALYSIS_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": channel_data}
+            ]
+        }]
+
+        # Las herramientas pueden correr con otro modelo (PULSE_TOOL_MODEL); el reporte lo redacta
+        # report_model en su propio turno, que en modo batch va por la Message Batches API y con
+        # streaming se publica en vivo (es el único turno que no puede terminar en tool_use)
+        report_model = select_model(stats)
+        model = TOOL_MODEL or report_model
+        separate_report_turn = streamer is not None or BATCH_FINAL_REPORT or model != report_model
+        if separate_report_turn:
+            messages[0]["content"].append({"type": "text", "text": TOOLS_PHASE_PROMPT})
+        print(f"🤖 Iniciando análisis agéntico con Claude ({model})...")
 
         # Loop agéntico
         max_iterations = 10
         iteration = 0
+        seen_tool_calls = Counter()
+        finalize = False
+        max_tokens = ANALYSIS_MAX_TOKENS
+        rolling_breakpoint = None
 
         while iteration < max_iterations:
             iteration += 1
             print(f"🔄 Iteración {iteration}/{max_iterations}")
 
-            # Llamar a Claude con herramientas
-            response = anthropic_client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=4096,
-                tools=TOOLS,
-                messages=messages
-            )
+            # Breakpoint móvil de prompt caching en el último bloque enviado: la siguiente
+            # iteración reutiliza todo el historial previo (herramientas + instrucciones + este = 3 de 4)
+            if rolling_breakpoint is not None:
+                rolling_breakpoint.pop("cache_control", None)
+            rolling_breakpoint = messages[-1]["content"][-1]
+            rolling_breakpoint["cache_control"] = {"type": "ephemeral"}
+
+            if finalize:
+                # Turno del reporte: vía batch (con respaldo sincrónico) o con report_model
+                if BATCH_FINAL_REPORT:
+                    return generate_final_report(messages, report_model)
+                model = report_model
+
+            # Llamar a Claude con herramientas (streaming: el texto se acumula a medida que llega)
+            text_parts = []
+            if streamer:
+                # En vivo solo el turno del reporte: los demás pueden terminar en tool_use
+                streamer.reset(live=finalize)
+            request = {"model": model, "max_tokens": max_tokens, "tools": TOOLS, "messages": messages}
+            if finalize:
+                # Turno de cierre: las herramientas siguen declaradas (el historial las usa) pero no se pueden llamar
+                request["tool_choice"] = {"type": "none"}
+            with anthropic_client.messages.stream(**request) as stream:
+                for text in stream.text_stream:
+                    text_parts.append(text)
+                    if streamer:
+                        streamer.feed(text)
+                response = stream.get_final_message()
 
             # Verificar si Claude quiere usar herramientas
             if response.stop_reason == "tool_use":
-                # Procesar todas las herramientas solicitadas
-                tool_results = []
-
-                for content_block in response.content:
-                    if content_block.type == "tool_use":
-                        tool_name = content_block.name
-                        tool_input = content_block.input
-                        tool_id = content_block.id
-
-                        print(f"  🔧 Ejecutando herramienta: {tool_name}")
-
-                        # Ejecutar herramienta
-                        result = process_tool_call(tool_name, tool_input)
-
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_id,
-                            "content": json.dumps(result, ensure_ascii=False)
-                        })
+                # Procesar todas las herramientas solicitadas (en paralelo si son varias)
+                tool_uses = [block for block in response.content if block.type == "tool_use"]
+                for content_block in tool_uses:
+                    print(f"  🔧 Ejecutando herramienta: {content_block.name}")
+
+                results = process_tool_calls([(block.name, block.input) for block in tool_uses])
+
+                tool_results = [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": block.id,
+                        "content": serialize_tool_result(result)
+                    }
+                    for block, result in zip(tool_uses, results)
+                ]
+
+                # Sin progreso: la misma llamada (herramienta + input) repetida -> pedir el reporte final
+                call_keys = [_tool_call_key(block.name, block.input) for block in tool_uses]
+                seen_tool_calls.update(call_keys)
+                if any(seen_tool_calls[key] > MAX_REPEATED_TOOL_CALLS for key in call_keys):
+                    print("⚠️  Llamadas a herramientas repetidas, pidiendo el reporte final")
+                    tool_results.append({"type": "text", "text": FINALIZE_PROMPT})
+                    finalize = True
 
                 # Añadir respuesta de Claude a mensajes
                 messages.append({"role": "assistant", "content": response.content})
@@ -869,16 +1294,31 @@ REGLAS ESTRICTAS:
                 messages.append({"role": "user", "content": tool_results})
 
             elif response.stop_reason == "end_turn":
-                # Claude terminó, extraer reporte final
+                text = "".join(text_parts)
+                if separate_report_turn and not finalize and len(text) <= TOOLS_PHASE_DONE_MAX_CHARS:
+                    # Fin de la fase de herramientas: el reporte se pide en un turno sin herramientas
+                    print("✅ Herramientas completadas, pidiendo el reporte final")
+                    messages.append({"role": "assistant", "content": response.content or [{"type": "text", "text": "LISTO"}]})
+                    messages.append({"role": "user", "content": [{"type": "text", "text": REPORT_PROMPT}]})
+                    finalize = True
+                    continue
+
+                # Claude terminó: el texto del reporte ya llegó por el stream
                 print("✅ Análisis completado")
+                return text
 
-                # Extraer texto del reporte
-                report_text = ""
-                for content_block in response.content:
-                    if hasattr(content_block, 'text'):
-                        report_text += content_block.text
+            elif response.stop_reason == "max_tokens" and any(block.type == "tool_use" for block in response.content):
+                # Se cortó armando una llamada a herramienta: el texto es solo el preámbulo, no un reporte
+                if max_tokens >= ANALYSIS_RETRY_MAX_TOKENS:
+                    print("❌ Llamada a herramienta truncada por max_tokens")
+                    return None
+                print(f"⚠️  Llamada a herramienta truncada por max_tokens, reintentando con {ANALYSIS_RETRY_MAX_TOKENS}")
+                max_tokens = ANALYSIS_RETRY_MAX_TOKENS
 
-                return report_text
+            elif response.stop_reason == "max_tokens" and text_parts:
+                # Reporte truncado: mejor enviar lo generado que perder la iteración
+                print("⚠️  Reporte truncado por max_tokens, se usa el texto parcial")
+                return "".join(text_parts)
 
             else:
                 print(f"⚠️  Stop reason inesperado: {response.stop_reason}")
@@ -896,31 +1336,25 @@ REGLAS ESTRICTAS:
 # ENVÍO DE REPORTE
 # ============================================================================
 
-def send_report_to_lead(report, enriched_messages):
-    """Envía reporte por DM al líder del proyecto"""
-    try:
-        # Obtener nombre del canal
-        try:
-            channel_info = slack_client.conversations_info(channel=CHANNEL_ID)
-            channel_name = channel_info['channel']['name']
-        except:
-            channel_name = "proyecto"
+# **negrita** -> *negrita*, y títulos "# ..." (Slack no los reconoce) sin los # (#canal queda intacto)
+_MD_FIX = re.compile(r'\*\*|^#{1,6}[ \t]+', re.MULTILINE)
 
-        # Abrir conversación DM
-        dm_response = slack_client.conversations_open(users=[LEAD_USER_ID])
-        dm_channel = dm_response['channel']['id']
 
-        # Generar métricas resumidas
-        real_messages = [m for m in enriched_messages if len(m.get('text', '')) > 15]
-        active_users = len(set(m['user_id'] for m in real_messages))
+def to_slack_mrkdwn(report):
+    """Corrige el Markdown que Claude a veces emite pese a las reglas del prompt"""
+    return _MD_FIX.sub(lambda m: '*' if m.group(0) == '**' else '', report)
 
-        try:
-            channel_members = slack_client.conversations_members(channel=CHANNEL_ID)
-            total_members = len(channel_members['members'])
-        except:
-            total_members = active_users
 
-        metrics_summary = f"""📊 *MÉTRICAS CLAVE (Últimos 7 días hábiles)*
+def format_report(report, stats, channel_name, total_members, report_date=None):
+    """Ensambla el mensaje completo (encabezado, métricas y reporte en mrkdwn de Slack)"""
+    # Métricas resumidas (mismo filtro de mensajes reales que el análisis)
+    real_messages = stats.real_messages
+    active_users = len(stats.active_users)
+
+    if total_members is None:
+        total_members = active_users
+
+    metrics_summary = f"""📊 *MÉTRICAS CLAVE (Últimos 7 días hábiles)*
 ----------
 📨 Mensajes: {len(real_messages)}
 👥 Usuarios activos: {active_users} de {total_members}
@@ -928,12 +1362,13 @@ def send_report_to_lead(report, enriched_messages):
 
 """
 
-        # Formatear reporte
-        formatted_report = report.replace('**', '*')
+    # Formatear reporte (negritas y títulos Markdown -> Slack mrkdwn en una pasada)
+    formatted_report = to_slack_mrkdwn(report)
 
-        # Ensamblar reporte completo
-        full_report = f"""📊 *REPORTE AGÉNTICO - #{channel_name}*
-{datetime.now().strftime('%d/%m/%Y')}
+    # Ensamblar reporte completo (con streaming se re-renderiza por chunk: la fecha viene de main())
+    report_date = report_date or datetime.now().strftime('%d/%m/%Y')
+    return f"""📊 *REPORTE AGÉNTICO - #{channel_name}*
+{report_date}
 
 {metrics_summary}{formatted_report}
 
@@ -941,12 +1376,107 @@ def send_report_to_lead(report, enriched_messages):
 🤖 Generado por Pulse Agent con Claude AI
 """
 
-        # Enviar
-        slack_client.chat_postMessage(
-            channel=dm_channel,
-            text=full_report,
-            mrkdwn=True
-        )
+
+class ReportStreamer:
+    """
+    Publica el reporte en el DM del líder mientras Claude lo escribe: un primer
+    chat_postMessage y luego chat_update cada ~1 KB nuevo, como mucho uno por segundo.
+    Solo se publica en vivo el turno del reporte, que no puede llamar herramientas; el texto
+    de los demás no se publica (si terminan en tool_use es solo el preámbulo).
+    Ante el primer error de Slack deja de publicar parciales.
+    """
+
+    def __init__(self, channel, render, first_chunk=500, update_chunk=1000, min_interval=1.0):
+        self.channel = channel
+        self.render = render  # texto parcial -> mensaje completo a publicar
+        self.first_chunk = first_chunk
+        self.update_chunk = update_chunk
+        self.min_interval = min_interval
+        self.ts = None
+        self.last_update = 0.0
+        self.enabled = True
+        self.reset()
+
+    def reset(self, live=False):
+        """Nueva respuesta de Claude: el texto anterior (si lo hubo) se reemplaza"""
+        self.parts = []
+        self.size = 0
+        self.published_size = 0
+        self.live = live
+
+    def feed(self, text):
+        """Acumula un fragmento del stream y publica si ya hay suficiente texto nuevo"""
+        self.parts.append(text)
+        self.size += len(text)
+        if not (self.live and self.enabled):
+            return
+
+        pending = self.size - self.published_size
+        threshold = self.first_chunk if self.ts is None else self.update_chunk
+        if pending >= threshold and time.monotonic() - self.last_update >= self.min_interval:
+            if self._publish(self.render("".join(self.parts) + "\n\n⏳ _Generando..._")):
+                self.published_size = self.size
+
+    def finish(self, full_text):
+        """Publica el texto definitivo (actualiza el mensaje en curso o lo crea); False si Slack falla"""
+        return self._publish(full_text)
+
+    def abort(self, text):
+        """Reemplaza el mensaje a medio escribir (si lo hay) por un aviso, p. ej. si el reporte falló"""
+        if self.ts is None:
+            return
+        try:
+            slack_client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        except SlackApiError as e:
+            print(f"⚠️  No se pudo actualizar el mensaje en curso: {e.response['error']}")
+
+    def discard(self):
+        """Borra el mensaje a medio escribir (si lo hay), p. ej. si el reporte se publicó aparte"""
+        if self.ts is None:
+            return
+        try:
+            slack_client.chat_delete(channel=self.channel, ts=self.ts)
+            self.ts = None
+        except SlackApiError as e:
+            print(f"⚠️  No se pudo borrar el mensaje en curso: {e.response['error']}")
+
+    def _publish(self, text):
+        try:
+            if self.ts is None:
+                response = slack_client.chat_postMessage(channel=self.channel, text=text, mrkdwn=True)
+                self.ts = response['ts']
+            else:
+                slack_client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        except SlackApiError as e:
+            print(f"⚠️  Streaming del reporte desactivado: {e.response['error']}")
+            self.enabled = False
+            return False
+        self.last_update = time.monotonic()
+        return True
+
+
+def open_lead_dm():
+    """ID del canal de DM con el líder del proyecto"""
+    dm_response = slack_client.conversations_open(users=[LEAD_USER_ID])
+    return dm_response['channel']['id']
+
+
+def send_report_to_lead(report, stats, channel_name, total_members, streamer=None, report_date=None,
+                        dm_channel=None):
+    """Envía reporte por DM al líder del proyecto (o cierra el mensaje que se fue publicando)"""
+    try:
+        full_report = format_report(report, stats, channel_name, total_members, report_date)
+
+        # Enviar (si el mensaje en curso no se pudo cerrar, se publica uno nuevo y se borra el parcial)
+        if not (streamer and streamer.finish(full_report)):
+            # DM abierto en main() junto con el contexto del canal (si falló, se reintenta acá)
+            slack_client.chat_postMessage(
+                channel=dm_channel or open_lead_dm(),
+                text=full_report,
+                mrkdwn=True
+            )
+            if streamer:
+                streamer.discard()
         print("✅ Reporte enviado al líder del proyecto")
         return True
 
@@ -965,29 +1495,63 @@ def send_report_to_lead(report, enriched_messages):
 def main():
     """Pipeline principal del agente"""
     print("🚀 Iniciando Pulse Agent (Sistema Agéntico)...")
-    print(f"📅 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+    # Hora de la corrida, tomada una vez: el encabezado y la fecha del reporte salen de acá
+    started_at = datetime.now()
+    report_date = started_at.strftime('%d/%m/%Y')
+    set_report_clock(started_at)
+    print(f"📅 {report_date} {started_at.strftime('%H:%M:%S')}")
     print("-" * 50)
 
-    # 1. Obtener mensajes del canal
-    messages = get_channel_messages()
+    # Nombre y miembros del canal, y el DM con el líder, en segundo plano mientras se leen
+    # y enriquecen los mensajes
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        channel_name_future = submit_with_report_clock(executor, get_channel_name, CHANNEL_ID)
+        total_members_future = submit_with_report_clock(executor, get_channel_member_count, CHANNEL_ID)
+        dm_channel_future = submit_with_report_clock(executor, open_lead_dm)
 
-    if not messages:
-        print("ℹ️  No hay mensajes para analizar")
-        return
+        # 1. Obtener mensajes del canal
+        messages = get_channel_messages()
+
+        if not messages:
+            print("ℹ️  No hay mensajes para analizar")
+            return
 
-    # 2. Enriquecer con nombres reales
-    enriched_messages = enrich_messages_with_names(messages)
-    print(f"👤 Nombres resueltos para {len(enriched_messages)} mensajes")
+        # 2. Enriquecer con nombres reales (cache precargado en bloque)
+        load_user_cache()
+        enriched_messages = enrich_messages_with_names(messages)
+        print(f"👤 Nombres resueltos para {len(enriched_messages)} mensajes")
+
+        channel_name = channel_name_future.result()
+        total_members = total_members_future.result()
+        try:
+            dm_channel = dm_channel_future.result()
+        except SlackApiError as e:
+            print(f"⚠️  No se pudo abrir el DM con el líder: {e.response['error']}")
+            dm_channel = None
+
+    # Filtrar y medir una sola vez: el análisis y el reporte comparten el resultado
+    stats = summarize_messages(enriched_messages)
+
+    # Opcional: ir publicando el reporte en el DM del líder mientras se genera
+    streamer = None
+    if STREAM_REPORT and not BATCH_FINAL_REPORT and dm_channel:
+        streamer = ReportStreamer(
+            dm_channel,
+            lambda partial: format_report(partial, stats, channel_name, total_members, report_date)
+        )
 
     # 3. Ejecutar análisis agéntico
-    report = run_agentic_analysis(enriched_messages)
+    report = run_agentic_analysis(stats, channel_name, total_members, streamer)
 
     if not report:
         print("❌ No se pudo generar el reporte")
+        # No dejar el mensaje "⏳ Generando..." a medio escribir en el DM del líder
+        if streamer:
+            streamer.abort("❌ No se pudo generar el reporte de hoy. Revisa los logs de Pulse.")
         return
 
     # 4. Enviar reporte al líder
-    send_report_to_lead(report, enriched_messages)
+    send_report_to_lead(report, stats, channel_name, total_members, streamer, report_date, dm_channel)
 
     print("-" * 50)
     print("✅ Pipeline agéntico completado exitosamente")
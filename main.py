@@ -1,20 +1,28 @@
 import os
+import re
+import hashlib
 import json
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from datetime import datetime, timedelta
+from pathlib import Path
+from string import Template
+from types import MappingProxyType
+from typing import NamedTuple
+import httpx
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
 from anthropic import Anthropic
 from dotenv import load_dotenv
 import time
-from supabase_client import get_supabase_manager, init_supabase
+from supabase_client import get_supabase_manager, init_supabase, set_report_clock, slack_user_row, submit_with_report_clock
 
-# Limpiar variables de entorno previas para forzar recarga
-for key in list(os.environ.keys()):
-    if key.startswith(('SLACK_', 'ANTHROPIC_', 'SUPABASE_', 'PROJECT_', 'ENVIRONMENT', 'LOG_LEVEL')):
-        del os.environ[key]
-
-# Cargar variables de entorno
-load_dotenv(override=True)
+# Cargar variables de entorno del .env junto al script (override: el .env manda sobre
+# valores viejos del shell; sin .env, p. ej. en GitHub Actions, se usan las del entorno)
+load_dotenv(dotenv_path=Path(__file__).resolve().parent / '.env', override=True)
 
 # Configuración
 SLACK_TOKEN = os.getenv('SLACK_BOT_TOKEN')
@@ -24,13 +32,194 @@ LEAD_USER_ID = os.getenv('PROJECT_LEAD_USER_ID')
 
 # Clientes
 slack_client = WebClient(token=SLACK_TOKEN)
-anthropic_client = Anthropic(api_key=ANTHROPIC_KEY)
+# Reintentar respetando Retry-After cuando Slack responde 429 (users.info en paralelo)
+slack_client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=3))
+# Pool HTTP propio para Anthropic: conexiones vivas 60s (el default de httpx las cierra a los 5s)
+anthropic_http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=60)
+)
+anthropic_client = Anthropic(api_key=ANTHROPIC_KEY, http_client=anthropic_http_client)
+
+# Keywords de análisis: cada familia se compila una sola vez en un patrón
+# (un escaneo por mensaje en vez de un `in` por keyword)
+def _compile_keywords(keywords):
+    """Compila una familia de keywords en un único patrón de búsqueda por substring"""
+    return re.compile('|'.join(re.escape(kw) for kw in keywords))
+
+UPDATE_KEYWORDS = ('update', 'actualización', 'progreso', 'avance',
+                   'completado', 'terminado', 'listo', 'deploy',
+                   'release', 'merged', 'aprobado', 'bloqueado',
+                   'pasó a', 'movido a', '%')
+POSITIVE_KEYWORDS = ('completado', 'listo', 'terminado', 'merged', 'aprobado',
+                     'resuelto', 'funciona', 'done', 'finished')
+NEGATIVE_KEYWORDS = ('bloqueado', 'stuck', 'problema', 'error', 'bug', 'crítico',
+                     'urgente', 'esperando', 'no puedo', 'blocked', 'issue')
+TECHNICAL_KEYWORDS = ('código', 'code', 'api', 'database', 'bug', 'error',
+                      'función', 'function', 'deploy', 'merge', 'commit')
+COORDINATION_KEYWORDS = ('reunión', 'meeting', 'deadline', 'entrega', 'sprint',
+                         'sync', 'stand-up', 'standup')
+ABSENCE_KEYWORDS = ('fuera', 'ausente', 'no estaré', 'enfermo', 'vacaciones',
+                    'permiso', 'offline')
+DELAYED_KEYWORDS = ('delayed', 'retrasado', 'retraso', 'atrasado')
+STATUS_BLOCKED_KEYWORDS = ('bloqueado', 'blocked', 'stuck', 'waiting', 'esperando')
+SENSITIVITY_KEYWORDS = ('deadline', 'cliente', 'urgente', 'crítico', 'client',
+                        'urgent', 'critical')
+OBJECTIVE_KEYWORDS = ('objetivo', 'meta', 'goal', 'target', 'milestone')
+DEADLINE_KEYWORDS = ('deadline', 'fecha límite', 'entrega', 'due date')
+DEVIATION_CAUSE_KEYWORDS = ('porque', 'debido a', 'por', 'retraso por', 'bloqueado por')
+DEVIATION_KEYWORDS = ('retraso', 'problema', 'bloqueado')
+BLOCKER_KEYWORDS = ('bloqueado', 'blocked', 'esperando', 'waiting', 'stuck', 'no puedo')
+DECISION_KEYWORDS = ('necesito que', 'requiero aprobación', 'necesitamos decidir',
+                     'hay que decidir', 'debemos decidir', 'need approval',
+                     'need to decide', '?')
+CRITICAL_KEYWORDS = ('crítico', 'urgente', 'problema grave', 'cliente en riesgo',
+                     'vamos a perder', 'critical', 'urgent', 'severe', 'losing client')
+MEETING_KEYWORDS = ('sync', 'sincronización', 'standup', 'stand-up', 'daily',
+                    'reunión de equipo', 'meeting de equipo')
+ATTENDANCE_KEYWORDS = ('estoy en', 'me uno', 'joining', 'en la reunión', 'en el sync',
+                       'en el daily', 'en el standup')
+MEETING_ABSENCE_KEYWORDS = ('no puedo ir', 'no podré', 'me ausento', 'cant join',
+                            'cannot attend', 'miss the', 'skip')
+RISK_LINK_KEYWORDS = ('crítico', 'urgente', 'problema', 'critical', 'urgent')
+
+UPDATE_RE = _compile_keywords(UPDATE_KEYWORDS)
+POSITIVE_RE = _compile_keywords(POSITIVE_KEYWORDS)
+NEGATIVE_RE = _compile_keywords(NEGATIVE_KEYWORDS)
+TECHNICAL_RE = _compile_keywords(TECHNICAL_KEYWORDS)
+COORDINATION_RE = _compile_keywords(COORDINATION_KEYWORDS)
+ABSENCE_RE = _compile_keywords(ABSENCE_KEYWORDS)
+DELAYED_RE = _compile_keywords(DELAYED_KEYWORDS)
+STATUS_BLOCKED_RE = _compile_keywords(STATUS_BLOCKED_KEYWORDS)
+SENSITIVITY_RE = _compile_keywords(SENSITIVITY_KEYWORDS)
+OBJECTIVE_RE = _compile_keywords(OBJECTIVE_KEYWORDS)
+DEADLINE_RE = _compile_keywords(DEADLINE_KEYWORDS)
+DEVIATION_CAUSE_RE = _compile_keywords(DEVIATION_CAUSE_KEYWORDS)
+DEVIATION_RE = _compile_keywords(DEVIATION_KEYWORDS)
+BLOCKER_RE = _compile_keywords(BLOCKER_KEYWORDS)
+DECISION_RE = _compile_keywords(DECISION_KEYWORDS)
+CRITICAL_RE = _compile_keywords(CRITICAL_KEYWORDS)
+MEETING_RE = _compile_keywords(MEETING_KEYWORDS)
+ATTENDANCE_RE = _compile_keywords(ATTENDANCE_KEYWORDS)
+MEETING_ABSENCE_RE = _compile_keywords(MEETING_ABSENCE_KEYWORDS)
+RISK_LINK_RE = _compile_keywords(RISK_LINK_KEYWORDS)
+
+# Progreso explícito: "80%" o "3 de 5"
+PERCENTAGE_RE = re.compile(r'(\d+)%')
+FRACTION_RE = re.compile(r'(\d+)\s+de\s+(\d+)')
+
+# Categoría -> patrón, para detectar todas las familias de un mensaje de una vez
+KEYWORD_CATEGORIES = {
+    'update': UPDATE_RE,
+    'positive': POSITIVE_RE,
+    'negative': NEGATIVE_RE,
+    'technical': TECHNICAL_RE,
+    'coordination': COORDINATION_RE,
+    'absence': ABSENCE_RE,
+    'delayed': DELAYED_RE,
+    'status_blocked': STATUS_BLOCKED_RE,
+    'sensitivity': SENSITIVITY_RE,
+    'objective': OBJECTIVE_RE,
+    'deadline': DEADLINE_RE,
+    'deviation_cause': DEVIATION_CAUSE_RE,
+    'deviation': DEVIATION_RE,
+    'blocker': BLOCKER_RE,
+    'decision': DECISION_RE,
+    'critical': CRITICAL_RE,
+    'meeting': MEETING_RE,
+    'attendance': ATTENDANCE_RE,
+    'meeting_absence': MEETING_ABSENCE_RE,
+    'risk_link': RISK_LINK_RE,
+}
+
+def scan_text(text_lower):
+    """Categorías de KEYWORD_CATEGORIES presentes en un texto ya en minúsculas"""
+    return frozenset(category for category, pattern in KEYWORD_CATEGORIES.items() if pattern.search(text_lower))
+
+class EnrichedMessage(NamedTuple):
+    """Mensaje de Slack con nombre resuelto; minúsculas y categorías se calculan una vez al enriquecer"""
+    user_id: str
+    user_name: str
+    text: str
+    text_lower: str
+    ts: str
+    hits: frozenset
+
+    def get(self, key, default=None):
+        """Acceso estilo dict, solo para los análisis que recorren mensajes junto con updates (dicts)"""
+        return getattr(self, key) if key in self._fields else default
+
+def _scan_message(msg):
+    """(texto en minúsculas, categorías) de un mensaje; en los dicts se calcula una sola vez y queda guardado"""
+    if isinstance(msg, EnrichedMessage):
+        return msg.text_lower, msg.hits
+    hits = msg.get('_hits')
+    if hits is None:
+        text_lower = msg.get('text', '').lower()
+        hits = scan_text(text_lower)
+        msg['_text_lower'] = text_lower
+        msg['_hits'] = hits
+    return msg['_text_lower'], hits
 
 # Cache de usuarios
 user_cache = {}
+user_cache_lock = threading.Lock()
+# Máximo de users.info simultáneos para los usuarios que falten en el cache
+MAX_USER_LOOKUPS = 8
+# Bots y usuarios eliminados (se filtran al llenar el cache, no en cada consulta)
+excluded_user_ids = set()
+
+def _prime_user_cache(max_age_minutes=10):
+    """
+    Llena user_cache con todo el workspace: usa la copia de Supabase si tiene
+    menos de max_age_minutes; si no, users.list paginado y se vuelve a persistir.
+    """
+    try:
+        supabase = get_supabase_manager()
+        cached_users = supabase.get_recent_users(max_age_minutes=max_age_minutes)
+    except Exception as e:
+        print(f"⚠️  Supabase no disponible para cache de usuarios: {e}")
+        supabase = None
+        cached_users = []
+
+    if cached_users:
+        for row in cached_users:
+            if row.get('is_bot'):
+                excluded_user_ids.add(row['user_id'])
+            else:
+                user_cache[row['user_id']] = f"{row['real_name']} (@{row['username']})"
+        print(f"👥 {len(cached_users)} usuarios cargados desde Supabase")
+        return len(cached_users)
+
+    users = []
+    cursor = None
+    try:
+        while True:
+            result = slack_client.users_list(limit=1000, cursor=cursor)
+            for user in result.get('members', []):
+                row = slack_user_row(user)
+                if row is None:
+                    excluded_user_ids.add(user['id'])
+                    continue
+                if row['is_bot']:
+                    excluded_user_ids.add(row['user_id'])
+                else:
+                    user_cache[row['user_id']] = f"{row['real_name']} (@{row['username']})"
+                users.append(row)
+
+            cursor = result.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                break
+    except SlackApiError as e:
+        print(f"⚠️  Error listando usuarios: {e.response['error']} (se resolverán uno a uno)")
+
+    if supabase and users:
+        supabase.save_users_batch(users)
+
+    print(f"👥 {len(users)} usuarios cargados desde Slack")
+    return len(users)
 
 def get_user_name(user_id):
-    """Obtiene nombre real del usuario (con cache)"""
+    """Obtiene nombre real del usuario (cache precargado; users.info solo si falta)"""
     if user_id in user_cache:
         return user_cache[user_id]
 
@@ -38,44 +227,53 @@ def get_user_name(user_id):
         result = slack_client.users_info(user=user_id)
         name = result['user']['real_name']
         username = result['user']['name']
-        user_cache[user_id] = f"{name} (@{username})"
+        with user_cache_lock:
+            user_cache[user_id] = f"{name} (@{username})"
         return user_cache[user_id]
     except:
         return f"Usuario {user_id}"
 
 def enrich_messages_with_names(messages):
-    """Añade nombres reales a los mensajes"""
+    """Añade nombres reales a los mensajes (un EnrichedMessage por mensaje de usuario)"""
+    # Resolver en paralelo los usuarios que no estén en cache (users.info es I/O puro)
+    missing = {msg['user'] for msg in messages if 'user' in msg} - user_cache.keys()
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(MAX_USER_LOOKUPS, len(missing))) as executor:
+            list(executor.map(get_user_name, missing))
+
     enriched = []
     for msg in messages:
         if 'user' in msg:
             user_name = get_user_name(msg['user'])
-            enriched.append({
-                'user_id': msg['user'],
-                'user_name': user_name,
-                'text': msg.get('text', ''),
-                'ts': msg['ts']
-            })
+            text = msg.get('text', '')
+            text_lower = text.lower()
+            enriched.append(EnrichedMessage(
+                user_id=msg['user'],
+                user_name=user_name,
+                text=text,
+                text_lower=text_lower,
+                ts=msg['ts'],
+                hits=scan_text(text_lower)
+            ))
     return enriched
 
-def calculate_metrics(messages, enriched_messages):
+def calculate_metrics(messages, enriched_messages, member_ids=None):
     """Calcula métricas del canal"""
 
-    # Obtener info del canal
-    try:
-        channel_info = slack_client.conversations_members(channel=CHANNEL_ID)
-        total_members = len(channel_info['members'])
-    except:
-        total_members = 0
+    # Obtener info del canal (main() ya la trae en paralelo)
+    if member_ids is None:
+        member_ids = get_channel_member_ids(CHANNEL_ID)
+    total_members = len(member_ids) if member_ids is not None else 0
 
     # Contar usuarios únicos activos
     active_users = set()
     for msg in enriched_messages:
-        active_users.add(msg['user_id'])
+        active_users.add(msg.user_id)
 
     # Contar mensajes por usuario
     user_message_count = {}
     for msg in enriched_messages:
-        user_name = msg['user_name']
+        user_name = msg.user_name
         user_message_count[user_name] = user_message_count.get(user_name, 0) + 1
 
     # Top 3 más activos
@@ -95,23 +293,52 @@ def init_db():
     """Inicializa Supabase"""
     return init_supabase()
 
-def calculate_business_days(days=10):
-    """Calcula timestamp del inicio de los últimos N días hábiles (solo lunes-viernes)"""
-    current_date = datetime.now()
-    business_days_count = 0
+def calculate_business_days(days=10, now=None):
+    """Calcula timestamp del inicio de los últimos N días hábiles (solo lunes-viernes, sin contar hoy)"""
+    current_date = now or datetime.now()
+    weekday = current_date.weekday()  # 0 = Monday, 6 = Sunday
 
-    while business_days_count < days:
-        current_date -= timedelta(days=1)
-        # 0 = Monday, 6 = Sunday
-        if current_date.weekday() < 5:  # Monday to Friday
-            business_days_count += 1
+    if days <= 0:
+        offset = 0
+    else:
+        # El primero es el último día hábil antes de hoy: ayer, o el viernes si hoy es domingo o lunes
+        offset = 3 if weekday == 0 else 2 if weekday == 6 else 1
+        last_weekday = (weekday - offset) % 7
+        # Faltan days-1 días hábiles hacia atrás desde ese día
+        full_weeks, extra = divmod(days - 1, 5)
+        offset += full_weeks * 7 + extra + (2 if extra > last_weekday else 0)
 
     # Retornar timestamp al inicio del día
-    start_of_day = current_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_day = (current_date - timedelta(days=offset)).replace(hour=0, minute=0, second=0, microsecond=0)
     return start_of_day.timestamp()
 
+def iter_channel_history(oldest, page_size=200):
+    """Itera las páginas de conversations.history siguiendo next_cursor"""
+    cursor = None
+    while True:
+        result = slack_client.conversations_history(
+            channel=CHANNEL_ID,
+            oldest=str(oldest),
+            cursor=cursor,
+            limit=page_size,
+            include_all_metadata=False
+        )
+        yield result['messages']
+
+        cursor = result.get('response_metadata', {}).get('next_cursor')
+        if not cursor:
+            break
+
+# Mensajes ya obtenidos en este proceso, por (canal, oldest)
+channel_messages_cache = {}
+
 def get_channel_messages(hours=24):
     """Obtiene mensajes del canal de las últimas X horas o días hábiles"""
+    oldest = calculate_business_days(days=10)
+    cache_key = (CHANNEL_ID, oldest)
+    if cache_key in channel_messages_cache:
+        return channel_messages_cache[cache_key]
+
     try:
         # Primero intentar obtener de Supabase
         supabase = get_supabase_manager()
@@ -119,23 +346,92 @@ def get_channel_messages(hours=24):
         
         if db_messages:
             print(f"✅ Obtenidos {len(db_messages)} mensajes de Supabase (últimos 10 días hábiles)")
+            channel_messages_cache[cache_key] = db_messages
             return db_messages
         
-        # Si no hay mensajes en BD, obtener de Slack
-        oldest = calculate_business_days(days=10)
-        result = slack_client.conversations_history(
-            channel=CHANNEL_ID,
-            oldest=str(oldest)
-        )
+        # Si no hay mensajes en BD, obtener de Slack (todas las páginas, no solo la primera)
+        messages = []
+        for page in iter_channel_history(oldest):
+            messages.extend(page)
 
-        messages = result['messages']
         print(f"✅ Obtenidos {len(messages)} mensajes de Slack (últimos 10 días hábiles)")
+        channel_messages_cache[cache_key] = messages
         return messages
 
     except SlackApiError as e:
         print(f"❌ Error obteniendo mensajes: {e.response['error']}")
         return []
 
+# Metadatos del canal: (tipo, channel_id) -> (expira_en según time.monotonic(), valor)
+channel_info_cache = {}
+CHANNEL_NAME_TTL_SECONDS = 600
+CHANNEL_MEMBERS_TTL_SECONDS = 600
+
+def _cached_channel_value(key, ttl_seconds, loader):
+    """Devuelve channel_info_cache[key] si no expiró; si no, lo carga (los fallos no se cachean)"""
+    cached = channel_info_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    value = loader()
+    if value is not None:
+        channel_info_cache[key] = (time.monotonic() + ttl_seconds, value)
+    return value
+
+def _fetch_channel_name(channel_id):
+    """Nombre del canal (None si Slack no responde)"""
+    try:
+        return slack_client.conversations_info(channel=channel_id)['channel']['name']
+    except Exception as e:
+        print(f"⚠️  No se pudo obtener nombre del canal: {e}")
+        return None
+
+def _fetch_channel_member_ids(channel_id, page_size=200):
+    """IDs de todos los miembros del canal siguiendo next_cursor (None si Slack no responde)"""
+    try:
+        member_ids = []
+        cursor = None
+        while True:
+            result = slack_client.conversations_members(channel=channel_id, cursor=cursor, limit=page_size)
+            member_ids.extend(result['members'])
+
+            cursor = result.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                return member_ids
+    except Exception as e:
+        print(f"⚠️  No se pudieron obtener miembros del canal: {e}")
+        return None
+
+def get_channel_name(channel_id):
+    """Nombre del canal, cacheado por CHANNEL_NAME_TTL_SECONDS ("proyecto" si Slack no responde)"""
+    name = _cached_channel_value(('name', channel_id), CHANNEL_NAME_TTL_SECONDS,
+                                 lambda: _fetch_channel_name(channel_id))
+    return name or "proyecto"
+
+def get_channel_member_ids(channel_id):
+    """IDs de los miembros del canal, cacheados por CHANNEL_MEMBERS_TTL_SECONDS (None si no se pudieron obtener)"""
+    return _cached_channel_value(('members', channel_id), CHANNEL_MEMBERS_TTL_SECONDS,
+                                 lambda: _fetch_channel_member_ids(channel_id))
+
+def open_lead_dm():
+    """Abre (o recupera) el DM con el líder del proyecto"""
+    try:
+        return slack_client.conversations_open(users=[LEAD_USER_ID])['channel']['id']
+    except SlackApiError as e:
+        print(f"⚠️  No se pudo abrir DM con el líder: {e.response['error']}")
+        return None
+
+def prefetch_channel_context(executor):
+    """
+    Lanza en paralelo las llamadas a Slack independientes entre sí
+    (nombre del canal, miembros y DM del líder). Retorna los futures.
+    """
+    return {
+        'channel_name': submit_with_report_clock(executor, get_channel_name, CHANNEL_ID),
+        'member_ids': submit_with_report_clock(executor, get_channel_member_ids, CHANNEL_ID),
+        'dm_channel': submit_with_report_clock(executor, open_lead_dm),
+    }
+
 def save_messages(messages):
     """Guarda mensajes en Supabase"""
     supabase = get_supabase_manager()
@@ -151,31 +447,24 @@ def get_user_info(user_id):
 
 def extract_project_updates(enriched_messages):
     """Detecta y extrae updates del proyecto de los mensajes"""
-    # Keywords que indican updates
-    update_keywords = [
-        'update', 'actualización', 'progreso', 'avance',
-        'completado', 'terminado', 'listo', 'deploy',
-        'release', 'merged', 'aprobado', 'bloqueado',
-        'pasó a', 'movido a', '%'
-    ]
-
     updates = []
 
     for msg in enriched_messages:
-        text = msg.get('text', '').lower()
+        text, hits = msg.text_lower, msg.hits
 
         # Filtrar mensajes cortos
         if len(text) < 20:
             continue
 
-        # Buscar keywords
-        has_update = any(keyword in text for keyword in update_keywords)
-
-        if has_update:
+        # Buscar keywords (UPDATE_KEYWORDS)
+        if 'update' in hits:
             updates.append({
-                'user_name': msg['user_name'],
-                'text': msg.get('text', ''),
-                'timestamp': msg['ts']
+                'user_name': msg.user_name,
+                'text': msg.text,
+                'timestamp': msg.ts,
+                # Escaneo ya hecho al enriquecer (lo reutilizan salud y progreso)
+                '_text_lower': msg.text_lower,
+                '_hits': msg.hits
             })
 
     # Ordenar por timestamp (cronológicamente)
@@ -185,37 +474,42 @@ def extract_project_updates(enriched_messages):
 
 def analyze_project_health(enriched_messages, updates):
     """Analiza la salud del proyecto basado en señales positivas y negativas"""
-    # Palabras clave
-    positive_keywords = ['completado', 'listo', 'terminado', 'merged', 'aprobado', 'resuelto', 'funciona', 'done', 'finished']
-    negative_keywords = ['bloqueado', 'stuck', 'problema', 'error', 'bug', 'crítico', 'urgente', 'esperando', 'no puedo', 'blocked', 'issue']
-
     señales_positivas = []
     señales_negativas = []
 
-    # Analizar todos los mensajes
-    all_messages = enriched_messages + [{'user_name': u['user_name'], 'text': u['text']} for u in updates]
-
-    for msg in all_messages:
-        text = msg.get('text', '').lower()
+    # Analizar todos los mensajes y luego los updates (que también traen user_name y text), sin copiar listas
+    for msg in chain(enriched_messages, updates):
+        text, hits = _scan_message(msg)
+        if 'positive' not in hits and 'negative' not in hits:
+            continue
         user_name = msg.get('user_name', 'Unknown')
 
-        # Buscar señales positivas
-        for keyword in positive_keywords:
-            if keyword in text:
-                señales_positivas.append({
-                    'user': user_name,
-                    'keyword': keyword,
-                    'context': msg.get('text', '')[:100]  # Primeros 100 caracteres
-                })
+        # Contexto recortado una vez por mensaje (lo comparten todas sus keywords);
+        # context_preview ya viene listo para el prompt
+        context = msg.get('text', '')[:100]  # Primeros 100 caracteres
+        context_preview = context[:60] + "..."
+
+        # Buscar señales positivas (solo se recorren las keywords si la familia aparece)
+        if 'positive' in hits:
+            for keyword in POSITIVE_KEYWORDS:
+                if keyword in text:
+                    señales_positivas.append({
+                        'user': user_name,
+                        'keyword': keyword,
+                        'context': context,
+                        'context_preview': context_preview
+                    })
 
         # Buscar señales negativas
-        for keyword in negative_keywords:
-            if keyword in text:
-                señales_negativas.append({
-                    'user': user_name,
-                    'keyword': keyword,
-                    'context': msg.get('text', '')[:100]
-                })
+        if 'negative' in hits:
+            for keyword in NEGATIVE_KEYWORDS:
+                if keyword in text:
+                    señales_negativas.append({
+                        'user': user_name,
+                        'keyword': keyword,
+                        'context': context,
+                        'context_preview': context_preview
+                    })
 
     # Calcular score de salud (0-100)
     total_signals = len(señales_positivas) + len(señales_negativas)
@@ -235,12 +529,14 @@ def analyze_participation_quality(enriched_messages):
     user_analysis = {}
 
     for msg in enriched_messages:
-        user_id = msg.get('user_id')
-        user_name = msg.get('user_name')
-        text = msg.get('text', '')
-
-        if user_id not in user_analysis:
-            user_analysis[user_id] = {
+        user_id = msg.user_id
+        user_name = msg.user_name
+        text = msg.text
+        hits = msg.hits
+
+        data = user_analysis.get(user_id)
+        if data is None:
+            data = user_analysis[user_id] = {
                 'name': user_name,
                 'total_messages': 0,
                 'preguntas': 0,
@@ -249,25 +545,12 @@ def analyze_participation_quality(enriched_messages):
                 'coordinacion': 0
             }
 
-        user_analysis[user_id]['total_messages'] += 1
-
-        # Detectar preguntas
-        if '?' in text:
-            user_analysis[user_id]['preguntas'] += 1
-
-        # Detectar respuestas (menciones)
-        if '<@' in text or '@' in text:
-            user_analysis[user_id]['respuestas'] += 1
-
-        # Detectar mensajes técnicos
-        technical_keywords = ['código', 'code', 'api', 'database', 'bug', 'error', 'función', 'function', 'deploy', 'merge', 'commit']
-        if any(kw in text.lower() for kw in technical_keywords):
-            user_analysis[user_id]['tecnico'] += 1
-
-        # Detectar coordinación
-        coordination_keywords = ['reunión', 'meeting', 'deadline', 'entrega', 'sprint', 'sync', 'stand-up', 'standup']
-        if any(kw in text.lower() for kw in coordination_keywords):
-            user_analysis[user_id]['coordinacion'] += 1
+        # Contadores sin ramas: cada condición suma 0 o 1
+        data['total_messages'] += 1
+        data['preguntas'] += '?' in text  # Preguntas
+        data['respuestas'] += '@' in text  # Respuestas (menciones; '<@' ya contiene '@')
+        data['tecnico'] += 'technical' in hits  # Mensajes técnicos
+        data['coordinacion'] += 'coordination' in hits  # Coordinación
 
     # Clasificar usuarios
     for user_id, data in user_analysis.items():
@@ -300,16 +583,27 @@ def analyze_participation_quality(enriched_messages):
 
     return user_analysis
 
-def infer_causes(enriched_messages, user_analysis, users_with_baseline):
+def group_messages_by_user(enriched_messages):
+    """Índice user_name -> mensajes, armado en una sola pasada"""
+    msgs_by_user = defaultdict(list)
+    for msg in enriched_messages:
+        msgs_by_user[msg.user_name].append(msg)
+    return msgs_by_user
+
+def infer_causes(enriched_messages, user_analysis, users_with_baseline, msgs_by_user=None):
     """Infiere causas de comportamiento basado en patrones"""
     causes = {}
+    if msgs_by_user is None:
+        msgs_by_user = group_messages_by_user(enriched_messages)
+    # Baseline por nombre (el primero gana, como la búsqueda lineal anterior)
+    baseline_by_name = {u['name']: u for u in reversed(users_with_baseline)}
 
     for user_id, analysis in user_analysis.items():
         user_name = analysis['name']
         total_msgs = analysis['total_messages']
 
         # Buscar baseline del usuario
-        baseline_info = next((u for u in users_with_baseline if u['name'] == user_name), None)
+        baseline_info = baseline_by_name.get(user_name)
 
         causa = None
         evidencia = []
@@ -324,9 +618,7 @@ def infer_causes(enriched_messages, user_analysis, users_with_baseline):
             comparison = baseline_info['comparison']
             if comparison['direction'] == 'por debajo' and comparison['diff_percentage'] > 50:
                 # Buscar mensaje de ausencia
-                ausencia_keywords = ['fuera', 'ausente', 'no estaré', 'enfermo', 'vacaciones', 'permiso', 'offline']
-                user_messages = [m['text'].lower() for m in enriched_messages if m['user_name'] == user_name]
-                if any(any(kw in msg for kw in ausencia_keywords) for msg in user_messages):
+                if any('absence' in m.hits for m in msgs_by_user.get(user_name, ())):
                     causa = "ausencia_reportada"
                     evidencia.append(f"Actividad {comparison['diff_percentage']}% por debajo del promedio")
                     evidencia.append("Usuario reportó ausencia")
@@ -355,54 +647,65 @@ def infer_causes(enriched_messages, user_analysis, users_with_baseline):
 
     return causes
 
+# Clasificaciones posibles de classify_project_status: constantes de solo lectura,
+# se combinan en el dict de resultado en vez de armarse en cada llamada
+STATUS_BLOCKED = MappingProxyType({
+    'status': "blocked", 'status_emoji': "🔴", 'status_text': "BLOQUEADO - Requiere atención inmediata"})
+STATUS_DELAYED = MappingProxyType({
+    'status': "delayed", 'status_emoji': "🟡", 'status_text': "RETRASADO - Necesita acción correctiva"})
+STATUS_FAST_TRACK = MappingProxyType({
+    'status': "fast_track", 'status_emoji': "🟢", 'status_text': "AVANCE RÁPIDO - Por encima del ritmo esperado"})
+STATUS_ON_TRACK = MappingProxyType({
+    'status': "on_track", 'status_emoji': "🟢", 'status_text': "EN TIEMPO - Progreso normal"})
+
+SENSITIVITY_TIME_SENSITIVE = MappingProxyType({
+    'sensitivity': "time_sensitive", 'sensitivity_emoji': "⏰",
+    'sensitivity_text': "SENSIBLE AL TIEMPO - Múltiples deadlines/clientes mencionados"})
+SENSITIVITY_NON_TIME_SENSITIVE = MappingProxyType({
+    'sensitivity': "non_time_sensitive", 'sensitivity_emoji': "✅",
+    'sensitivity_text': "NO CRÍTICO - Sin presiones temporales detectadas"})
+
+RESOURCES_CAN_REDUCE = MappingProxyType({
+    'resources': "can_reduce", 'resources_emoji': "📉",
+    'resources_text': "CAPACIDAD DISPONIBLE - Actividad por debajo del promedio"})
+RESOURCES_NEED = MappingProxyType({
+    'resources': "need", 'resources_emoji': "📈",
+    'resources_text': "REQUIERE MÁS RECURSOS - Actividad muy por encima del promedio"})
+RESOURCES_PERFECT = MappingProxyType({
+    'resources': "perfect", 'resources_emoji': "✅",
+    'resources_text': "RECURSOS ADECUADOS - Actividad dentro del rango normal"})
+RESOURCES_UNKNOWN = MappingProxyType({
+    'resources': "unknown", 'resources_emoji': "❓",
+    'resources_text': "DESCONOCIDO - Sin histórico para comparar"})
+
 def classify_project_status(enriched_messages, channel_baseline):
     """Clasifica el estado del proyecto basado en análisis de mensajes y baseline"""
-    # Keywords para detectar estado
-    delayed_keywords = ['delayed', 'retrasado', 'retraso', 'atrasado']
-    blocked_keywords = ['bloqueado', 'blocked', 'stuck', 'waiting', 'esperando']
-    sensitivity_keywords = ['deadline', 'cliente', 'urgente', 'crítico', 'client', 'urgent', 'critical']
-
     delayed_count = 0
     blocked_count = 0
     sensitivity_count = 0
 
     for msg in enriched_messages:
-        text = msg.get('text', '').lower()
+        hits = msg.hits
 
-        if any(kw in text for kw in delayed_keywords):
+        if 'delayed' in hits:
             delayed_count += 1
-        if any(kw in text for kw in blocked_keywords):
+        if 'status_blocked' in hits:
             blocked_count += 1
-        if any(kw in text for kw in sensitivity_keywords):
+        if 'sensitivity' in hits:
             sensitivity_count += 1
 
     # Determinar status
     if blocked_count > 2:
-        status = "blocked"
-        status_emoji = "🔴"
-        status_text = "BLOQUEADO - Requiere atención inmediata"
+        status = STATUS_BLOCKED
     elif delayed_count > 1:
-        status = "delayed"
-        status_emoji = "🟡"
-        status_text = "RETRASADO - Necesita acción correctiva"
+        status = STATUS_DELAYED
     elif channel_baseline and len(enriched_messages) > channel_baseline.get('avg_messages_per_day', 0) * 1.5:
-        status = "fast_track"
-        status_emoji = "🟢"
-        status_text = "AVANCE RÁPIDO - Por encima del ritmo esperado"
+        status = STATUS_FAST_TRACK
     else:
-        status = "on_track"
-        status_emoji = "🟢"
-        status_text = "EN TIEMPO - Progreso normal"
+        status = STATUS_ON_TRACK
 
     # Determinar sensitivity
-    if sensitivity_count > 3:
-        sensitivity = "time_sensitive"
-        sensitivity_emoji = "⏰"
-        sensitivity_text = "SENSIBLE AL TIEMPO - Múltiples deadlines/clientes mencionados"
-    else:
-        sensitivity = "non_time_sensitive"
-        sensitivity_emoji = "✅"
-        sensitivity_text = "NO CRÍTICO - Sin presiones temporales detectadas"
+    sensitivity = SENSITIVITY_TIME_SENSITIVE if sensitivity_count > 3 else SENSITIVITY_NON_TIME_SENSITIVE
 
     # Determinar recursos (basado en baseline)
     if channel_baseline:
@@ -410,77 +713,49 @@ def classify_project_status(enriched_messages, channel_baseline):
         current_activity = len(enriched_messages)
 
         if current_activity < avg_activity * 0.6:
-            resources = "can_reduce"
-            resources_emoji = "📉"
-            resources_text = "CAPACIDAD DISPONIBLE - Actividad por debajo del promedio"
+            resources = RESOURCES_CAN_REDUCE
         elif current_activity > avg_activity * 1.3:
-            resources = "need"
-            resources_emoji = "📈"
-            resources_text = "REQUIERE MÁS RECURSOS - Actividad muy por encima del promedio"
+            resources = RESOURCES_NEED
         else:
-            resources = "perfect"
-            resources_emoji = "✅"
-            resources_text = "RECURSOS ADECUADOS - Actividad dentro del rango normal"
+            resources = RESOURCES_PERFECT
     else:
-        resources = "unknown"
-        resources_emoji = "❓"
-        resources_text = "DESCONOCIDO - Sin histórico para comparar"
+        resources = RESOURCES_UNKNOWN
 
-    return {
-        'status': status,
-        'status_emoji': status_emoji,
-        'status_text': status_text,
-        'sensitivity': sensitivity,
-        'sensitivity_emoji': sensitivity_emoji,
-        'sensitivity_text': sensitivity_text,
-        'resources': resources,
-        'resources_emoji': resources_emoji,
-        'resources_text': resources_text
-    }
+    return {**status, **sensitivity, **resources}
 
 def extract_project_progress(enriched_messages, updates):
     """Extrae información de progreso del proyecto"""
-    import re
-
     objetivo_mencionado = None
     progreso_actual = None
     tiempo_estimado = None
     razon_desviacion = None
 
-    # Buscar objetivos/metas
-    objetivo_keywords = ['objetivo', 'meta', 'goal', 'target', 'milestone']
-    deadline_keywords = ['deadline', 'fecha límite', 'entrega', 'due date']
-
-    for msg in enriched_messages + [{'text': u['text'], 'user_name': u['user_name']} for u in updates]:
+    for msg in chain(enriched_messages, updates):
         text = msg.get('text', '')
+        hits = _scan_message(msg)[1]
 
-        # Buscar objetivos
-        for kw in objetivo_keywords:
-            if kw in text.lower():
-                objetivo_mencionado = text[:150]  # Primeros 150 caracteres
-                break
+        # Buscar objetivos/metas
+        if 'objective' in hits:
+            objetivo_mencionado = text[:150]  # Primeros 150 caracteres
 
-        # Buscar porcentajes (X%, "X de Y")
-        percentage_match = re.search(r'(\d+)%', text)
+        # Buscar porcentajes (X%, "X de Y"); el `in` evita el regex en la mayoría de mensajes
+        percentage_match = PERCENTAGE_RE.search(text) if '%' in text else None
         if percentage_match:
             progreso_actual = f"{percentage_match.group(1)}%"
 
-        fraction_match = re.search(r'(\d+)\s+de\s+(\d+)', text)
+        fraction_match = FRACTION_RE.search(text) if 'de' in text else None
         if fraction_match:
             num = int(fraction_match.group(1))
             den = int(fraction_match.group(2))
             progreso_actual = f"{num}/{den} ({int(num/den*100)}%)"
 
         # Buscar deadlines
-        for kw in deadline_keywords:
-            if kw in text.lower():
-                tiempo_estimado = text[:150]
-                break
+        if 'deadline' in hits:
+            tiempo_estimado = text[:150]
 
         # Buscar razón de desviación
-        if any(word in text.lower() for word in ['porque', 'debido a', 'por', 'retraso por', 'bloqueado por']):
-            if any(neg in text.lower() for neg in ['retraso', 'problema', 'bloqueado']):
-                razon_desviacion = text[:150]
+        if 'deviation_cause' in hits and 'deviation' in hits:
+            razon_desviacion = text[:150]
 
     return {
         'objetivo_mencionado': objetivo_mencionado,
@@ -489,49 +764,59 @@ def extract_project_progress(enriched_messages, updates):
         'razon_desviacion': razon_desviacion
     }
 
-def analyze_capacity_per_person(enriched_messages, users_with_baseline, channel_id):
+def analyze_capacity_per_person(enriched_messages, users_with_baseline, channel_id, msgs_by_user=None,
+                                member_ids=None, baselines=None):
     """Analiza capacidad por persona - TODOS los miembros del canal"""
     capacity_analysis = {}
+    if msgs_by_user is None:
+        msgs_by_user = group_messages_by_user(enriched_messages)
 
     # Obtener TODOS los miembros del canal
-    try:
-        all_members_response = slack_client.conversations_members(channel=channel_id)
-        all_member_ids = all_members_response['members']
-    except:
+    all_member_ids = member_ids if member_ids is not None else get_channel_member_ids(channel_id)
+    if all_member_ids is None:
         # Si falla, usar solo los usuarios con baseline
         all_member_ids = [u['id'] for u in users_with_baseline]
 
     # Crear dict de usuarios activos para búsqueda rápida
     active_users = {u['id']: u for u in users_with_baseline}
 
+    # Baselines de los miembros sin actividad hoy, en una sola consulta
+    # (analyze_with_claude ya los trae junto con los de los activos)
+    if baselines is not None:
+        inactive_baselines = baselines
+    else:
+        inactive_baselines = get_user_baselines(
+            [member_id for member_id in all_member_ids
+             if member_id not in active_users and member_id not in excluded_user_ids],
+            channel_id, days=30
+        )
+
     for member_id in all_member_ids:
-        # Obtener info del usuario
-        try:
-            user_info_response = slack_client.users_info(user=member_id)
-            user_data = user_info_response['user']
-
-            # Skip bots
-            if user_data.get('is_bot') or user_data.get('deleted'):
-                continue
-
-            user_name = user_data.get('real_name', member_id)
-        except:
-            user_name = member_id
-
-        # Verificar si está en usuarios activos
-        if member_id in active_users:
-            user_info = active_users[member_id]
-            messages_today = user_info['messages_today']
-            baseline = user_info.get('baseline')
-            comparison = user_info.get('comparison', {})
-        else:
-            # Usuario sin actividad hoy
-            messages_today = 0
-            baseline = get_user_baseline(member_id, channel_id, days=30)
-            if baseline:
-                comparison = compare_to_baseline(0, baseline['avg_messages_per_day'], "mensajes")
-            else:
-                comparison = {'has_baseline': False}
+        # Skip bots y eliminados (filtrados al precargar user_cache)
+        if member_id in excluded_user_ids:
+            continue
+
+        # Mismo nombre que en enriched_messages, para cruzar sus mensajes
+        user_name = get_user_name(member_id)
+
+        user_info = active_users.get(member_id)
+        if user_info is None:
+            # Usuario sin actividad hoy: entrada resumida, sin análisis de carga ni bloqueadores.
+            # Del baseline solo importa si tiene histórico (con histórico, el promedio nunca es 0)
+            capacity_analysis[member_id] = {
+                'name': user_name,
+                'carga': "⚪ SIN ACTIVIDAD - No participó hoy",
+                'disponibilidad': ("❓ AUSENTE HOY - Verificar disponibilidad" if inactive_baselines.get(member_id)
+                                   else "❓ SIN DATOS - Usuario nuevo o inactivo"),
+                'bloqueadores': ["Ninguno detectado"],
+                'puede_liberarse': "✅ DISPONIBLE - Sin actividad detectada",
+                'messages_today': 0
+            }
+            continue
+
+        messages_today = user_info['messages_today']
+        baseline = user_info.get('baseline')
+        comparison = user_info.get('comparison', {})
 
         # Calcular carga actual
         if messages_today == 0:
@@ -561,15 +846,8 @@ def analyze_capacity_per_person(enriched_messages, users_with_baseline, channel_
             disponibilidad = "⚠️ CAPACIDAD LIMITADA - En su nivel normal"
 
         # Detectar bloqueadores en sus mensajes
-        user_messages = [m['text'] for m in enriched_messages if m.get('user_name') == user_name]
-        bloqueadores = []
-
-        blocker_keywords = ['bloqueado', 'blocked', 'esperando', 'waiting', 'stuck', 'no puedo']
-        for msg in user_messages:
-            for kw in blocker_keywords:
-                if kw in msg.lower():
-                    bloqueadores.append(msg[:100])
-                    break
+        bloqueadores = [m.text[:100] for m in msgs_by_user.get(user_name, ())
+                        if 'blocker' in m.hits]
 
         # Análisis de si puede liberarse
         if messages_today == 0:
@@ -596,19 +874,16 @@ def extract_required_decisions(enriched_messages):
     """Extrae decisiones pendientes"""
     decisions = []
 
-    decision_keywords = ['necesito que', 'requiero aprobación', 'necesitamos decidir', 'hay que decidir',
-                         'debemos decidir', 'need approval', 'need to decide', '?']
-
     for msg in enriched_messages:
-        text = msg.get('text', '')
-        user_name = msg.get('user_name')
+        text = msg.text
+        user_name = msg.user_name
 
         # Solo si contiene pregunta o frase de decisión
-        if any(kw in text.lower() for kw in decision_keywords):
+        if 'decision' in msg.hits:
             decisions.append({
                 'que': text[:200],
                 'quien_pide': user_name,
-                'timestamp': msg.get('ts')
+                'timestamp': msg.ts
             })
 
     return decisions[:5]  # Top 5 más relevantes
@@ -617,19 +892,17 @@ def extract_critical_risks(enriched_messages):
     """Extrae solo riesgos de ALTO IMPACTO"""
     risks = []
 
-    critical_keywords = ['crítico', 'urgente', 'problema grave', 'cliente en riesgo',
-                        'vamos a perder', 'critical', 'urgent', 'severe', 'losing client']
-
     for msg in enriched_messages:
-        text = msg.get('text', '')
-        user_name = msg.get('user_name')
+        text = msg.text
+        user_name = msg.user_name
+        text_lower, hits = msg.text_lower, msg.hits
 
-        if any(kw in text.lower() for kw in critical_keywords):
+        if 'critical' in hits:
             # Inferir probabilidad e impacto
-            if 'crítico' in text.lower() or 'critical' in text.lower():
+            if 'crítico' in text_lower or 'critical' in text_lower:
                 impacto = "ALTO"
                 probabilidad = "ALTA"
-            elif 'cliente' in text.lower() or 'client' in text.lower():
+            elif 'cliente' in text_lower or 'client' in text_lower:
                 impacto = "ALTO"
                 probabilidad = "MEDIA"
             else:
@@ -647,40 +920,35 @@ def extract_critical_risks(enriched_messages):
 
 def detect_meeting_attendance(enriched_messages):
     """Detecta asistencia a reuniones de sincronización"""
-    # Solo reuniones de sincronización específicas
-    meeting_keywords = ['sync', 'sincronización', 'standup', 'stand-up', 'daily', 'reunión de equipo', 'meeting de equipo']
-    attendance_keywords = ['estoy en', 'me uno', 'joining', 'en la reunión', 'en el sync', 'en el daily', 'en el standup']
-    absence_keywords = ['no puedo ir', 'no podré', 'me ausento', 'cant join', 'cannot attend', 'miss the', 'skip']
-
     meetings_detected = []
     attendees = []
     absences = []
 
     for msg in enriched_messages:
-        text = msg.get('text', '')
-        user_name = msg.get('user_name')
+        text = msg.text
+        user_name = msg.user_name
 
-        # Detectar si menciona meeting
-        is_meeting_mention = any(kw in text.lower() for kw in meeting_keywords)
+        text_lower, hits = msg.text_lower, msg.hits
 
-        if is_meeting_mention:
+        # Detectar si menciona meeting (solo reuniones de sincronización específicas)
+        if 'meeting' in hits:
             meetings_detected.append({
                 'mentioned_by': user_name,
                 'text': text[:150]
             })
 
             # Detectar asistencia
-            if any(kw in text.lower() for kw in attendance_keywords):
+            if 'attendance' in hits:
                 attendees.append({
                     'name': user_name,
                     'context': text[:100]
                 })
 
             # Detectar ausencia
-            if any(kw in text.lower() for kw in absence_keywords):
+            if 'meeting_absence' in hits:
                 # Intentar extraer razón
                 razon = "No especificada"
-                if 'porque' in text.lower() or 'due to' in text.lower():
+                if 'porque' in text_lower or 'due to' in text_lower:
                     razon = text[:150]
 
                 absences.append({
@@ -695,6 +963,8 @@ def detect_meeting_attendance(enriched_messages):
         'absences': absences
     }
 
+SLACK_LINK_TEMPLATE = "https://slack.com/app_redirect?channel={}&message_ts={}"
+
 def get_slack_thread_links(enriched_messages, updates, channel_id):
     """Genera links de Slack a threads importantes"""
     links = {
@@ -705,135 +975,251 @@ def get_slack_thread_links(enriched_messages, updates, channel_id):
 
     # Links para updates
     for update in updates[:5]:
-        ts = update['timestamp'].replace('.', '')
-        link = f"https://slack.com/app_redirect?channel={channel_id}&message_ts={update['timestamp']}"
         links['updates_links'].append({
             'text': update['text'][:50] + '...',
-            'link': link,
+            'link': SLACK_LINK_TEMPLATE.format(channel_id, update['timestamp']),
             'user': update['user_name']
         })
 
-    # Links para decisiones (mensajes con ?)
+    # Links para decisiones (mensajes con ?) y riesgos: una sola pasada, hasta 3 de cada uno
+    decisions_links = links['decisions_links']
+    risks_links = links['risks_links']
     for msg in enriched_messages:
-        if '?' in msg.get('text', ''):
-            ts = msg['ts'].replace('.', '')
-            link = f"https://slack.com/app_redirect?channel={channel_id}&message_ts={msg['ts']}"
-            links['decisions_links'].append({
-                'text': msg['text'][:50] + '...',
-                'link': link,
-                'user': msg['user_name']
-            })
-            if len(links['decisions_links']) >= 3:
-                break
+        if len(decisions_links) >= 3 and len(risks_links) >= 3:
+            break
 
-    # Links para riesgos
-    risk_keywords = ['crítico', 'urgente', 'problema', 'critical', 'urgent']
-    for msg in enriched_messages:
-        text = msg.get('text', '')
-        if any(kw in text.lower() for kw in risk_keywords):
-            ts = msg['ts'].replace('.', '')
-            link = f"https://slack.com/app_redirect?channel={channel_id}&message_ts={msg['ts']}"
-            links['risks_links'].append({
+        text = msg.text
+        if len(decisions_links) < 3 and '?' in text:
+            decisions_links.append({
                 'text': text[:50] + '...',
-                'link': link,
-                'user': msg['user_name']
+                'link': SLACK_LINK_TEMPLATE.format(channel_id, msg.ts),
+                'user': msg.user_name
+            })
+        if len(risks_links) < 3 and 'risk_link' in msg.hits:
+            risks_links.append({
+                'text': text[:50] + '...',
+                'link': SLACK_LINK_TEMPLATE.format(channel_id, msg.ts),
+                'user': msg.user_name
             })
-            if len(links['risks_links']) >= 3:
-                break
 
     return links
 
-def analyze_with_claude(enriched_messages, metrics, updates):
+def run_all_analyses(enriched_messages, updates, users_with_baseline, channel_baseline, member_ids=None,
+                     baselines=None):
+    """
+    Ejecuta todos los análisis sobre el escaneo precalculado de cada mensaje
+    (minúsculas + categorías de keywords, hechos una sola vez al enriquecer).
+    """
+    # Los updates armados fuera de extract_project_updates se escanean aquí, una vez
+    for update in updates:
+        _scan_message(update)
+    msgs_by_user = group_messages_by_user(enriched_messages)
+
+    participation_quality = analyze_participation_quality(enriched_messages)
+    return {
+        'project_health': analyze_project_health(enriched_messages, updates),
+        'participation_quality': participation_quality,
+        'inferred_causes': infer_causes(enriched_messages, participation_quality, users_with_baseline, msgs_by_user),
+        'project_status': classify_project_status(enriched_messages, channel_baseline),
+        'project_progress': extract_project_progress(enriched_messages, updates),
+        'capacity_analysis': analyze_capacity_per_person(enriched_messages, users_with_baseline, CHANNEL_ID, msgs_by_user,
+                                                         member_ids, baselines),
+        'required_decisions': extract_required_decisions(enriched_messages),
+        'critical_risks': extract_critical_risks(enriched_messages),
+        'meeting_attendance': detect_meeting_attendance(enriched_messages),
+        'slack_links': get_slack_thread_links(enriched_messages, updates, CHANNEL_ID),
+    }
+
+# Plantilla del prompt: el texto fijo se arma una sola vez al importar
+PROMPT_TEMPLATE = Template("""Eres un analista ejecutivo que genera reportes diarios STANDALONE (sin asumir memoria del lector).
+
+DATOS DEL CANAL #${channel_name}:
+----------
+${message_text}
+----------
+
+${updates_context}
+
+${structured_context}
+
+${automated_analysis}
+
+INSTRUCCIONES CRÍTICAS:
+1. NUNCA uses lenguaje genérico - SIEMPRE nombres completos
+2. CADA afirmación DEBE tener: NOMBRE + NÚMERO + POR QUÉ
+3. NO asumas memoria del lector - cada reporte es independiente
+4. USA SOLO datos del análisis automatizado previo
+5. Cuantifica TODO (números, fechas, porcentajes)
+6. Si no tienes datos concretos, di "No especificado" en vez de inventar
+
+Genera el reporte en este formato EXACTO:
+
+----------
+🎯 *ESTADO DEL PROYECTO*
+----------
+Estado: ${status_emoji} ${status_text}
+Sensibilidad: ${sensitivity_emoji} ${sensitivity_text}
+Recursos: ${resources_emoji} ${resources_text}
+
+Progreso vs Objetivo:
+• ${progreso_actual} completado
+• ${objetivo}
+
+----------
+📋 *UPDATES DEL PROYECTO*
+----------
+[Lista updates cronológicamente con formato: "• NOMBRE: texto específico del update"
+Si no hay updates: "Sin updates reportados hoy"]
+
+----------
+👥 *ESTADO DEL EQUIPO*
+----------
+Total miembros del canal: {total_members}
+Activos hoy: {active_today}
+Inactivos hoy: {inactive_today}
+
+[Si hay usuarios inactivos, lista cada uno con formato:
+"• NOMBRE: razón"
+Si todos activos: "Todos los miembros participaron hoy"]
+
+----------
+📞 *ASISTENCIA A REUNIONES DE SINCRONIZACIÓN*
+----------
+[Si meeting_attendance['meetings_detected']:
+  "Se detectaron N reunión(es) de sincronización"
+  "Asistentes: lista nombres"
+  Si hay absences: "Ausencias: lista con formato '• NOMBRE: razón'"
+Si no: "No se detectaron reuniones de sincronización registradas"]
+
+----------
+👥 *RECURSOS Y CAPACIDAD*
+----------
+[Para CADA persona del análisis de capacidad, usa este formato exacto:]
+
+*NOMBRE COMPLETO*
+- Carga actual: [emoji y dato específico del análisis]
+- Disponibilidad: [emoji y conclusión]
+- Bloqueadores: [lista específica o "Ninguno"]
+- Podría liberarse: [emoji y análisis]
+
+----------
+⚠️ *DECISIONES REQUERIDAS*
+----------
+[Solo si hay decisiones pendientes en el análisis. Lista con formato:
+"• QUIÉN pide QUÉ: texto específico"
+Si no hay: "Ninguna decisión pendiente"]
+
+----------
+🔴 *RIESGOS DE ALTO IMPACTO*
+----------
+[Solo riesgos críticos del análisis. Formato:
+"• RIESGO: [texto]
+  Reportado por: NOMBRE
+  Probabilidad: [ALTA/MEDIA]
+  Impacto: [ALTO/MEDIO-ALTO]"
+Si no hay: "No se detectaron riesgos críticos"]
+
+RECUERDA: Nombres específicos + números concretos + por qués basados en datos.""")
+
+def analyze_with_claude(enriched_messages, metrics, updates, channel_name=None, member_ids=None):
     """Analiza mensajes con Claude usando baseline histórico"""
 
-    # Filtrar solo mensajes reales (no automáticos del sistema)
+    # Filtrar solo mensajes reales (no automáticos del sistema); desde main() ya llegan
+    # sin los de 15 caracteres o menos, el corte de largo queda para otros llamadores
     real_messages = []
     for msg in enriched_messages:
-        text = msg.get('text', '')
-        if (text and
-            'se ha unido al canal' not in text.lower() and
-            'has joined' not in text.lower() and
-            '<@' not in text[:5] and
-            len(text) > 15):
-            real_messages.append(msg)
+        text = msg.text
+        # Cortes baratos primero; las minúsculas ya vienen calculadas desde el enriquecimiento
+        if not text or len(text) <= 15 or '<@' in text[:5]:
+            continue
+        low = msg.text_lower
+        if 'se ha unido al canal' in low or 'has joined' in low:
+            continue
+        real_messages.append(msg)
 
-    if not real_messages:
-        return "Sin actividad significativa en las últimas 24 horas."
+    if not real_messages and not updates:
+        # Sin conversación real ni updates pendientes no hay nada que mandarle a Claude
+        return "Sin actividad significativa en las últimas 24 horas.", None
 
     # Obtener baseline del canal
     channel_baseline = get_channel_baseline(CHANNEL_ID, days=30)
 
     # Preparar análisis con baseline por usuario
-    users_with_baseline = []
+    users_with_baseline = {}
+    # Mensajes por usuario en una sola pasada
+    user_msg_counts = Counter(m.user_id for m in real_messages)
+    # Baselines de los usuarios activos y del resto de los miembros (capacidad) en una sola consulta
+    baseline_ids = set(user_msg_counts)
+    if member_ids is not None:
+        baseline_ids.update(m for m in member_ids if m not in excluded_user_ids)
+    baselines = get_user_baselines(baseline_ids, CHANNEL_ID, days=30)
     for msg in real_messages:
-        user_id = msg['user_id']
-        user_name = msg['user_name']
+        user_id = msg.user_id
+        user_name = msg.user_name
 
         # Evitar duplicados
-        if not any(u['id'] == user_id for u in users_with_baseline):
-            # Contar mensajes de este usuario hoy
-            user_msg_count = sum(1 for m in real_messages if m['user_id'] == user_id)
+        if user_id in users_with_baseline:
+            continue
 
-            # Obtener baseline del usuario
-            user_baseline = get_user_baseline(user_id, CHANNEL_ID, days=30)
+        # Contar mensajes de este usuario hoy
+        user_msg_count = user_msg_counts[user_id]
 
-            user_data = {
-                'id': user_id,
-                'name': user_name,
-                'messages_today': user_msg_count
-            }
+        # Baseline del usuario (precargado)
+        user_baseline = baselines.get(user_id)
 
-            if user_baseline:
-                comparison = compare_to_baseline(
-                    user_msg_count,
-                    user_baseline['avg_messages_per_day'],
-                    "mensajes"
-                )
-                user_data['baseline'] = user_baseline
-                user_data['comparison'] = comparison
-            else:
-                user_data['baseline'] = None
-                user_data['comparison'] = {'has_baseline': False}
-
-            users_with_baseline.append(user_data)
-
-    # Análisis predictivo y estructura
-    project_health = analyze_project_health(real_messages, updates)
-    participation_quality = analyze_participation_quality(real_messages)
-    inferred_causes = infer_causes(real_messages, participation_quality, users_with_baseline)
-    project_status = classify_project_status(real_messages, channel_baseline)
-    project_progress = extract_project_progress(real_messages, updates)
-    capacity_analysis = analyze_capacity_per_person(real_messages, users_with_baseline, CHANNEL_ID)
-    required_decisions = extract_required_decisions(real_messages)
-    critical_risks = extract_critical_risks(real_messages)
-    meeting_attendance = detect_meeting_attendance(real_messages)
-    slack_links = get_slack_thread_links(real_messages, updates, CHANNEL_ID)
-
-    # Calcular estado del equipo
-    total_members = len(capacity_analysis)
-    active_today = len([u for u in capacity_analysis.values() if u['messages_today'] > 0])
-    inactive_today = total_members - active_today
+        user_data = {
+            'id': user_id,
+            'name': user_name,
+            'messages_today': user_msg_count
+        }
 
+        if user_baseline:
+            comparison = compare_to_baseline(
+                user_msg_count,
+                user_baseline['avg_messages_per_day'],
+                "mensajes"
+            )
+            user_data['baseline'] = user_baseline
+            user_data['comparison'] = comparison
+        else:
+            user_data['baseline'] = None
+            user_data['comparison'] = {'has_baseline': False}
+
+        users_with_baseline[user_id] = user_data
+
+    # Análisis predictivo y estructura (un solo escaneo de keywords por mensaje)
+    analyses = run_all_analyses(real_messages, updates, list(users_with_baseline.values()), channel_baseline,
+                                member_ids, baselines if member_ids is not None else None)
+    project_health = analyses['project_health']
+    participation_quality = analyses['participation_quality']
+    inferred_causes = analyses['inferred_causes']
+    project_status = analyses['project_status']
+    project_progress = analyses['project_progress']
+    capacity_analysis = analyses['capacity_analysis']
+    required_decisions = analyses['required_decisions']
+    critical_risks = analyses['critical_risks']
+    meeting_attendance = analyses['meeting_attendance']
+    slack_links = analyses['slack_links']
+
+    # Calcular estado del equipo (una sola pasada: los inactivos dan el conteo)
+    total_members = len(capacity_analysis)
     inactive_users = []
     for user_id, user_data in capacity_analysis.items():
         if user_data['messages_today'] == 0:
             # Buscar razón inferida
-            razon = "Razón desconocida"
-            if user_id in inferred_causes:
-                razon = inferred_causes[user_id]['causa_inferida']
+            cause = inferred_causes.get(user_id)
             inactive_users.append({
                 'name': user_data['name'],
-                'razon': razon
+                'razon': cause['causa_inferida'] if cause else "Razón desconocida"
             })
+    inactive_today = len(inactive_users)
+    active_today = total_members - inactive_today
 
     # Preparar contexto para Claude
-    conversations = []
-    for msg in real_messages:
-        conversations.append(f"*{msg['user_name']}*: {msg['text']}")
-    message_text = "\n".join(conversations)
+    message_text = "\n".join(f"*{msg.user_name}*: {msg.text}" for msg in real_messages)
 
-    # Preparar info de baseline para el prompt
-    baseline_context = ""
+    # Preparar info de baseline para el prompt (las secciones se arman como listas y se unen una vez)
+    baseline_parts = []
 
     if channel_baseline:
         channel_comparison = compare_to_baseline(
@@ -841,69 +1227,69 @@ def analyze_with_claude(enriched_messages, metrics, updates):
             channel_baseline['avg_messages_per_day'],
             "mensajes del canal"
         )
-        baseline_context += f"\n📊 BASELINE DEL CANAL (últimos 30 días):\n"
-        baseline_context += f"• Promedio mensajes/día: {channel_baseline['avg_messages_per_day']}\n"
-        baseline_context += f"• Hoy: {len(real_messages)} mensajes\n"
-        baseline_context += f"• Comparación: {channel_comparison['message']}\n"
-
-    baseline_context += f"\n📊 BASELINE POR USUARIO:\n"
-    for user in users_with_baseline:
-        baseline_context += f"\n*{user['name']}*:\n"
-        baseline_context += f"• Mensajes hoy: {user['messages_today']}\n"
+        baseline_parts.append("\n📊 BASELINE DEL CANAL (últimos 30 días):\n")
+        baseline_parts.append(f"• Promedio mensajes/día: {channel_baseline['avg_messages_per_day']}\n")
+        baseline_parts.append(f"• Hoy: {len(real_messages)} mensajes\n")
+        baseline_parts.append(f"• Comparación: {channel_comparison['message']}\n")
+
+    baseline_parts.append("\n📊 BASELINE POR USUARIO:\n")
+    for user in users_with_baseline.values():
+        baseline_parts.append(f"\n*{user['name']}*:\n")
+        baseline_parts.append(f"• Mensajes hoy: {user['messages_today']}\n")
         if user['baseline']:
-            baseline_context += f"• Promedio últimos 30 días: {user['baseline']['avg_messages_per_day']}/día\n"
-            baseline_context += f"• Días activo: {user['baseline']['days_active']}/30 ({user['baseline']['participation_rate']}%)\n"
+            baseline_parts.append(f"• Promedio últimos 30 días: {user['baseline']['avg_messages_per_day']}/día\n")
+            baseline_parts.append(f"• Días activo: {user['baseline']['days_active']}/30 ({user['baseline']['participation_rate']}%)\n")
             if user['comparison']['has_baseline']:
-                baseline_context += f"• {user['comparison']['message']}\n"
+                baseline_parts.append(f"• {user['comparison']['message']}\n")
         else:
-            baseline_context += f"• Sin histórico suficiente (usuario nuevo o poco activo)\n"
+            baseline_parts.append("• Sin histórico suficiente (usuario nuevo o poco activo)\n")
+    baseline_context = "".join(baseline_parts)
 
-    # Obtener nombre del canal
-    try:
-        channel_info = slack_client.conversations_info(channel=CHANNEL_ID)
-        channel_name = channel_info['channel']['name']
-    except:
-        channel_name = "proyecto"
+    # Obtener nombre del canal (cacheado)
+    channel_name = channel_name or get_channel_name(CHANNEL_ID)
 
     # Preparar sección de updates
     updates_context = ""
     if updates:
-        updates_context = "\n📋 UPDATES DEL PROYECTO (Pre-filtrados):\n"
-        updates_context += "----------\n"
+        updates_parts = ["\n📋 UPDATES DEL PROYECTO (Pre-filtrados):\n", "----------\n"]
         for update in updates:
-            updates_context += f"• *{update['user_name']}*: {update['text']}\n"
-        updates_context += "----------\n"
+            updates_parts.append(f"• *{update['user_name']}*: {update['text']}\n")
+        updates_parts.append("----------\n")
+        updates_context = "".join(updates_parts)
 
     # Preparar análisis automatizado
-    automated_analysis = f"\n🤖 ANÁLISIS AUTOMATIZADO:\n"
-    automated_analysis += "----------\n"
-    automated_analysis += f"📊 *Salud del proyecto:* {project_health['score']}/100\n"
+    analysis_parts = [
+        "\n🤖 ANÁLISIS AUTOMATIZADO:\n",
+        "----------\n",
+        f"📊 *Salud del proyecto:* {project_health['score']}/100\n",
+    ]
 
     if project_health['señales_positivas']:
-        automated_analysis += f"\n✅ *Señales positivas detectadas:*\n"
+        analysis_parts.append("\n✅ *Señales positivas detectadas:*\n")
         for signal in project_health['señales_positivas'][:5]:  # Top 5
-            automated_analysis += f"  • {signal['user']}: {signal['keyword']} - {signal['context'][:60]}...\n"
+            analysis_parts.append(f"  • {signal['user']}: {signal['keyword']} - {signal['context_preview']}\n")
 
     if project_health['señales_negativas']:
-        automated_analysis += f"\n⚠️ *Señales negativas detectadas:*\n"
+        analysis_parts.append("\n⚠️ *Señales negativas detectadas:*\n")
         for signal in project_health['señales_negativas'][:5]:  # Top 5
-            automated_analysis += f"  • {signal['user']}: {signal['keyword']} - {signal['context'][:60]}...\n"
+            analysis_parts.append(f"  • {signal['user']}: {signal['keyword']} - {signal['context_preview']}\n")
 
-    automated_analysis += f"\n👥 *Participación por calidad:*\n"
+    analysis_parts.append("\n👥 *Participación por calidad:*\n")
     for user_id, data in participation_quality.items():
-        automated_analysis += f"  • {data['name']} ({data['tipo']}): {data['total_messages']} msgs - {data['temas_principales']}\n"
+        analysis_parts.append(f"  • {data['name']} ({data['tipo']}): {data['total_messages']} msgs - {data['temas_principales']}\n")
 
     if inferred_causes:
-        automated_analysis += f"\n🔍 *Causas inferidas:*\n"
+        analysis_parts.append("\n🔍 *Causas inferidas:*\n")
         for user_id, cause_data in inferred_causes.items():
-            automated_analysis += f"  • {cause_data['user_name']}: {cause_data['causa_inferida']}\n"
+            analysis_parts.append(f"  • {cause_data['user_name']}: {cause_data['causa_inferida']}\n")
             for ev in cause_data['evidencia']:
-                automated_analysis += f"    - {ev}\n"
+                analysis_parts.append(f"    - {ev}\n")
 
-    automated_analysis += "----------\n"
+    analysis_parts.append("----------\n")
+    automated_analysis = "".join(analysis_parts)
 
     # Preparar contexto estructurado para Claude
-    structured_context = f"""
+    structured_parts = [f"""
 🎯 ESTADO DEL PROYECTO (Análisis automatizado):
 - Status: {project_status['status_emoji']} {project_status['status_text']}
 - Sensibilidad: {project_status['sensitivity_emoji']} {project_status['sensitivity_text']}
@@ -916,126 +1302,61 @@ def analyze_with_claude(enriched_messages, metrics, updates):
 - Razón desviación: {project_progress['razon_desviacion'] or 'N/A'}
 
 👥 CAPACIDAD POR PERSONA:
-"""
+"""]
     for user_id, cap_data in capacity_analysis.items():
-        structured_context += f"\n{cap_data['name']}:\n"
-        structured_context += f"  - Carga: {cap_data['carga']}\n"
-        structured_context += f"  - Disponibilidad: {cap_data['disponibilidad']}\n"
-        structured_context += f"  - Bloqueadores: {', '.join(cap_data['bloqueadores'][:2])}\n"
-        structured_context += f"  - Puede liberarse: {cap_data['puede_liberarse']}\n"
-
-    structured_context += f"\n⚠️ DECISIONES REQUERIDAS: {len(required_decisions)} pendientes\n"
-    structured_context += f"🔴 RIESGOS CRÍTICOS: {len(critical_risks)} detectados\n"
-
-    structured_context += f"\n👥 ESTADO DEL EQUIPO:\n"
-    structured_context += f"  - Total miembros: {total_members}\n"
-    structured_context += f"  - Activos hoy: {active_today}\n"
-    structured_context += f"  - Inactivos hoy: {inactive_today}\n"
+        structured_parts.append(f"\n{cap_data['name']}:\n")
+        structured_parts.append(f"  - Carga: {cap_data['carga']}\n")
+        structured_parts.append(f"  - Disponibilidad: {cap_data['disponibilidad']}\n")
+        structured_parts.append(f"  - Bloqueadores: {', '.join(cap_data['bloqueadores'][:2])}\n")
+        structured_parts.append(f"  - Puede liberarse: {cap_data['puede_liberarse']}\n")
+
+    structured_parts.append(f"\n⚠️ DECISIONES REQUERIDAS: {len(required_decisions)} pendientes\n")
+    structured_parts.append(f"🔴 RIESGOS CRÍTICOS: {len(critical_risks)} detectados\n")
+
+    structured_parts.append("\n👥 ESTADO DEL EQUIPO:\n")
+    structured_parts.append(f"  - Total miembros: {total_members}\n")
+    structured_parts.append(f"  - Activos hoy: {active_today}\n")
+    structured_parts.append(f"  - Inactivos hoy: {inactive_today}\n")
     if inactive_users:
-        structured_context += f"  - Usuarios inactivos:\n"
+        structured_parts.append("  - Usuarios inactivos:\n")
         for inactive_user in inactive_users:
-            structured_context += f"    • {inactive_user['name']}: {inactive_user['razon']}\n"
+            structured_parts.append(f"    • {inactive_user['name']}: {inactive_user['razon']}\n")
 
-    structured_context += f"\n📞 ASISTENCIA A REUNIONES DE SINCRONIZACIÓN:\n"
+    structured_parts.append("\n📞 ASISTENCIA A REUNIONES DE SINCRONIZACIÓN:\n")
     if meeting_attendance['meetings_detected']:
-        structured_context += f"  - Reuniones detectadas: {meeting_attendance['num_meetings']}\n"
-        structured_context += f"  - Asistentes: {', '.join(meeting_attendance['attendees']) if meeting_attendance['attendees'] else 'Ninguno registrado'}\n"
+        structured_parts.append(f"  - Reuniones detectadas: {meeting_attendance['num_meetings']}\n")
+        structured_parts.append(f"  - Asistentes: {', '.join(meeting_attendance['attendees']) if meeting_attendance['attendees'] else 'Ninguno registrado'}\n")
         if meeting_attendance['absences']:
-            structured_context += f"  - Ausencias:\n"
+            structured_parts.append("  - Ausencias:\n")
             for absence in meeting_attendance['absences']:
-                structured_context += f"    • {absence['name']}: {absence['reason']}\n"
+                structured_parts.append(f"    • {absence['name']}: {absence['reason']}\n")
     else:
-        structured_context += f"  - No se detectaron reuniones de sincronización registradas\n"
-
-    prompt = f"""Eres un analista ejecutivo que genera reportes diarios STANDALONE (sin asumir memoria del lector).
-
-DATOS DEL CANAL #{channel_name}:
-----------
-{message_text}
-----------
-
-{updates_context}
-
-{structured_context}
-
-{automated_analysis}
-
-INSTRUCCIONES CRÍTICAS:
-1. NUNCA uses lenguaje genérico - SIEMPRE nombres completos
-2. CADA afirmación DEBE tener: NOMBRE + NÚMERO + POR QUÉ
-3. NO asumas memoria del lector - cada reporte es independiente
-4. USA SOLO datos del análisis automatizado previo
-5. Cuantifica TODO (números, fechas, porcentajes)
-6. Si no tienes datos concretos, di "No especificado" en vez de inventar
-
-Genera el reporte en este formato EXACTO:
-
-----------
-🎯 *ESTADO DEL PROYECTO*
-----------
-Estado: {project_status['status_emoji']} {project_status['status_text']}
-Sensibilidad: {project_status['sensitivity_emoji']} {project_status['sensitivity_text']}
-Recursos: {project_status['resources_emoji']} {project_status['resources_text']}
-
-Progreso vs Objetivo:
-• {project_progress['progreso_actual']} completado
-• {project_progress['objetivo_mencionado'][:100] if project_progress['objetivo_mencionado'] else 'Objetivo no especificado en conversaciones'}
-
-----------
-📋 *UPDATES DEL PROYECTO*
-----------
-[Lista updates cronológicamente con formato: "• NOMBRE: texto específico del update"
-Si no hay updates: "Sin updates reportados hoy"]
-
-----------
-👥 *ESTADO DEL EQUIPO*
-----------
-Total miembros del canal: {{total_members}}
-Activos hoy: {{active_today}}
-Inactivos hoy: {{inactive_today}}
-
-[Si hay usuarios inactivos, lista cada uno con formato:
-"• NOMBRE: razón"
-Si todos activos: "Todos los miembros participaron hoy"]
-
-----------
-📞 *ASISTENCIA A REUNIONES DE SINCRONIZACIÓN*
-----------
-[Si meeting_attendance['meetings_detected']:
-  "Se detectaron N reunión(es) de sincronización"
-  "Asistentes: lista nombres"
-  Si hay absences: "Ausencias: lista con formato '• NOMBRE: razón'"
-Si no: "No se detectaron reuniones de sincronización registradas"]
-
-----------
-👥 *RECURSOS Y CAPACIDAD*
-----------
-[Para CADA persona del análisis de capacidad, usa este formato exacto:]
-
-*NOMBRE COMPLETO*
-- Carga actual: [emoji y dato específico del análisis]
-- Disponibilidad: [emoji y conclusión]
-- Bloqueadores: [lista específica o "Ninguno"]
-- Podría liberarse: [emoji y análisis]
-
-----------
-⚠️ *DECISIONES REQUERIDAS*
-----------
-[Solo si hay decisiones pendientes en el análisis. Lista con formato:
-"• QUIÉN pide QUÉ: texto específico"
-Si no hay: "Ninguna decisión pendiente"]
-
-----------
-🔴 *RIESGOS DE ALTO IMPACTO*
-----------
-[Solo riesgos críticos del análisis. Formato:
-"• RIESGO: [texto]
-  Reportado por: NOMBRE
-  Probabilidad: [ALTA/MEDIA]
-  Impacto: [ALTO/MEDIO-ALTO]"
-Si no hay: "No se detectaron riesgos críticos"]
-
-RECUERDA: Nombres específicos + números concretos + por qués basados en datos."""
+        structured_parts.append("  - No se detectaron reuniones de sincronización registradas\n")
+    structured_context = "".join(structured_parts)
+
+    prompt = PROMPT_TEMPLATE.substitute(
+        channel_name=channel_name,
+        message_text=message_text,
+        updates_context=updates_context,
+        structured_context=structured_context,
+        automated_analysis=automated_analysis,
+        status_emoji=project_status['status_emoji'],
+        status_text=project_status['status_text'],
+        sensitivity_emoji=project_status['sensitivity_emoji'],
+        sensitivity_text=project_status['sensitivity_text'],
+        resources_emoji=project_status['resources_emoji'],
+        resources_text=project_status['resources_text'],
+        progreso_actual=project_progress['progreso_actual'],
+        objetivo=(project_progress['objetivo_mencionado'][:100] if project_progress['objetivo_mencionado']
+                  else 'Objetivo no especificado en conversaciones'),
+    )
+
+    # Mismo prompt en la última hora (p.ej. re-ejecución manual) -> reutilizar la respuesta
+    prompt_hash = hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+    cached_analysis = get_cached_report(prompt_hash)
+    if cached_analysis:
+        print("♻️  Reutilizando análisis previo (mismo contexto)")
+        return cached_analysis, slack_links
 
     print("🤔 Analizando con contexto histórico...")
 
@@ -1047,6 +1368,7 @@ RECUERDA: Nombres específicos + números concretos + por qués basados en datos
         )
 
         analysis = message.content[0].text
+        save_cached_report(prompt_hash, analysis)
         print("✅ Análisis completado con baseline")
         return analysis, slack_links
 
@@ -1054,69 +1376,70 @@ RECUERDA: Nombres específicos + números concretos + por qués basados en datos
         print(f"❌ Error en análisis: {e}")
         return None, None
 
-def generate_summary_metrics(enriched_messages):
-    """Genera métricas clave de los últimos 10 días hábiles"""
-    # Filtrar mensajes reales
-    real_messages = [m for m in enriched_messages if len(m.get('text', '')) > 15]
+def filter_real_messages(enriched_messages):
+    """Mensajes reales (más de 15 caracteres); main() lo calcula una vez para análisis y métricas"""
+    return [m for m in enriched_messages if len(m.text) > 15]
+
+def generate_summary_metrics(real_messages, member_ids=None):
+    """Genera métricas clave de los últimos 10 días hábiles (recibe los mensajes ya filtrados)"""
     messages_total = len(real_messages)
 
     # Usuarios activos
-    active_users = len(set(m['user_id'] for m in real_messages))
+    active_users = len(set(m.user_id for m in real_messages))
 
     # Obtener total de miembros
+    if member_ids is None:
+        member_ids = get_channel_member_ids(CHANNEL_ID)
+    total_members = len(member_ids) if member_ids is not None else active_users
+
+    return "".join([
+        "📊 *MÉTRICAS CLAVE (Últimos 10 días hábiles)*\n",
+        "----------\n",
+        f"📨 Mensajes: {messages_total}\n",
+        f"👥 Usuarios activos: {active_users} de {total_members}\n",
+        "----------\n\n",
+    ])
+
+def send_report_to_lead(report, real_messages, slack_links, channel_name=None, dm_channel=None,
+                        member_ids=None, report_date=None):
+    """Envía reporte por DM al líder del proyecto (main() precarga canal, DM y miembros)"""
     try:
-        channel_info = slack_client.conversations_members(channel=CHANNEL_ID)
-        total_members = len(channel_info['members'])
-    except:
-        total_members = active_users
-
-    metrics_text = "📊 *MÉTRICAS CLAVE (Últimos 10 días hábiles)*\n"
-    metrics_text += "----------\n"
-    metrics_text += f"📨 Mensajes: {messages_total}\n"
-    metrics_text += f"👥 Usuarios activos: {active_users} de {total_members}\n"
-    metrics_text += "----------\n\n"
+        # Obtener nombre del canal (cacheado; main() ya lo resolvió)
+        channel_name = channel_name or get_channel_name(CHANNEL_ID)
 
-    return metrics_text
-
-def send_report_to_lead(report, enriched_messages, slack_links):
-    """Envía reporte por DM al líder del proyecto"""
-    try:
-        # Obtener nombre del canal
-        channel_info = slack_client.conversations_info(channel=CHANNEL_ID)
-        channel_name = channel_info['channel']['name']
-
-        # Abrir conversación DM
-        dm_response = slack_client.conversations_open(users=[LEAD_USER_ID])
-        dm_channel = dm_response['channel']['id']
+        # Abrir conversación DM si no vino precargada
+        if not dm_channel:
+            dm_response = slack_client.conversations_open(users=[LEAD_USER_ID])
+            dm_channel = dm_response['channel']['id']
 
         # Generar métricas resumidas
-        metrics_summary = generate_summary_metrics(enriched_messages)
+        metrics_summary = generate_summary_metrics(real_messages, member_ids)
 
         # Formatear con espaciado
         formatted_report = report.replace('**', '*')
 
         # Preparar sección de links de Slack
-        links_section = "\n\n----------\n"
-        links_section += "🔗 *ACCESO A DETALLES*\n"
-        links_section += "----------\n"
+        links_parts = ["\n\n----------\n", "🔗 *ACCESO A DETALLES*\n", "----------\n"]
 
         if slack_links and slack_links['updates_links']:
-            links_section += "\n*Updates principales:*\n"
+            links_parts.append("\n*Updates principales:*\n")
             for link_data in slack_links['updates_links'][:3]:
-                links_section += f"• <{link_data['link']}|{link_data['user']}: {link_data['text']}>\n"
+                links_parts.append(f"• <{link_data['link']}|{link_data['user']}: {link_data['text']}>\n")
 
         if slack_links and slack_links['decisions_links']:
-            links_section += "\n*Decisiones/Preguntas:*\n"
+            links_parts.append("\n*Decisiones/Preguntas:*\n")
             for link_data in slack_links['decisions_links'][:3]:
-                links_section += f"• <{link_data['link']}|{link_data['user']}: {link_data['text']}>\n"
+                links_parts.append(f"• <{link_data['link']}|{link_data['user']}: {link_data['text']}>\n")
 
         if slack_links and slack_links['risks_links']:
-            links_section += "\n*Riesgos mencionados:*\n"
+            links_parts.append("\n*Riesgos mencionados:*\n")
             for link_data in slack_links['risks_links'][:3]:
-                links_section += f"• <{link_data['link']}|{link_data['user']}: {link_data['text']}>\n"
+                links_parts.append(f"• <{link_data['link']}|{link_data['user']}: {link_data['text']}>\n")
+        links_section = "".join(links_parts)
 
         # Ensamblar reporte completo con métricas al inicio y links al final
-        full_report = f"📊 *REPORTE DIARIO - #{channel_name}*\n{datetime.now().strftime('%d/%m/%Y')}\n\n{metrics_summary}{formatted_report}{links_section}"
+        report_date = report_date or datetime.now().strftime('%d/%m/%Y')
+        full_report = f"📊 *REPORTE DIARIO - #{channel_name}*\n{report_date}\n\n{metrics_summary}{formatted_report}{links_section}"
 
         # Enviar con mejor formato
         slack_client.chat_postMessage(
@@ -1134,12 +1457,19 @@ def send_report_to_lead(report, enriched_messages, slack_links):
 def main():
     """Pipeline principal"""
     print("🚀 Iniciando Pulse...")
-    print(f"📅 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+    # Hora de la corrida, tomada una vez: el encabezado y la fecha del reporte salen de acá
+    started_at = datetime.now()
+    report_date = started_at.strftime('%d/%m/%Y')
+    set_report_clock(started_at)
+    print(f"📅 {report_date} {started_at.strftime('%H:%M:%S')}")
     print("-" * 50)
 
     # 1. Inicializar BD
     init_db()
 
+    # Precargar el directorio de usuarios (una llamada paginada en vez de users.info por persona)
+    _prime_user_cache()
+
     # 2. Obtener mensajes
     messages = get_channel_messages(hours=24)
 
@@ -1154,27 +1484,42 @@ def main():
         print("ℹ️  No hay actividad nueva desde el último análisis")
         return
 
-    # 4. Enriquecer con nombres reales
-    enriched_messages = enrich_messages_with_names(messages)
-    print(f"👤 Nombres resueltos para {len(enriched_messages)} mensajes")
+    # Nombre del canal, miembros y DM del líder no dependen de los mensajes:
+    # se piden en paralelo mientras se enriquecen y analizan localmente
+    with ThreadPoolExecutor(max_workers=3) as prefetch_pool:
+        prefetched = prefetch_channel_context(prefetch_pool)
 
-    # 5. Extraer updates del proyecto
-    updates = extract_project_updates(enriched_messages)
-    print(f"📋 Detectados {len(updates)} updates del proyecto")
+        # 4. Enriquecer con nombres reales
+        enriched_messages = enrich_messages_with_names(messages)
+        print(f"👤 Nombres resueltos para {len(enriched_messages)} mensajes")
 
-    # 6. Calcular métricas
-    metrics = calculate_metrics(messages, enriched_messages)
-    print(f"📊 Métricas calculadas: {metrics['active_users']} usuarios activos")
+        # 5. Extraer updates del proyecto
+        updates = extract_project_updates(enriched_messages)
+        print(f"📋 Detectados {len(updates)} updates del proyecto")
 
-    # 7. Analizar con Claude
-    analysis, slack_links = analyze_with_claude(enriched_messages, metrics, updates)
+        # Recoger lo que necesita el análisis (cada helper ya maneja sus propios errores);
+        # el DM recién se espera al enviar, así su apertura se solapa con la llamada a Claude
+        channel_name = prefetched['channel_name'].result()
+        member_ids = prefetched['member_ids'].result()
 
-    if not analysis:
-        print("❌ No se pudo generar análisis")
-        return
+        # 6. Calcular métricas
+        metrics = calculate_metrics(messages, enriched_messages, member_ids)
+        print(f"📊 Métricas calculadas: {metrics['active_users']} usuarios activos")
+
+        # Mensajes reales: un solo filtro compartido por el análisis y las métricas del reporte
+        real_messages = filter_real_messages(enriched_messages)
+
+        # 7. Analizar con Claude
+        analysis, slack_links = analyze_with_claude(real_messages, metrics, updates, channel_name, member_ids)
+
+        if not analysis:
+            print("❌ No se pudo generar análisis")
+            return
+
+        dm_channel = prefetched['dm_channel'].result()
 
     # 8. Enviar reporte
-    send_report_to_lead(analysis, enriched_messages, slack_links)
+    send_report_to_lead(analysis, real_messages, slack_links, channel_name, dm_channel, member_ids, report_date)
 
     print("-" * 50)
     print("✅ Pipeline completado exitosamente")
@@ -1188,6 +1533,36 @@ def get_user_baseline(user_id, channel_id, days=30):
         print(f"❌ Error obteniendo baseline de usuario {user_id}: {e}")
         return None
 
+def get_user_baselines(user_ids, channel_id, days=30):
+    """Obtiene baselines de varios usuarios con una sola consulta a Supabase"""
+    try:
+        supabase = get_supabase_manager()
+        return supabase.get_user_baselines_batch(list(user_ids), channel_id, days)
+    except Exception as e:
+        print(f"❌ Error obteniendo baselines de usuarios: {e}")
+        return {}
+
+# Vigencia de una respuesta de Claude cacheada para el mismo prompt
+REPORT_CACHE_MAX_AGE_MINUTES = 60
+
+def get_cached_report(prompt_hash):
+    """Respuesta de Claude ya generada para este prompt (None si no hay o expiró)"""
+    try:
+        supabase = get_supabase_manager()
+        return supabase.get_cached_report(prompt_hash, REPORT_CACHE_MAX_AGE_MINUTES)
+    except Exception as e:
+        print(f"⚠️  No se pudo leer el cache de reportes: {e}")
+        return None
+
+def save_cached_report(prompt_hash, analysis):
+    """Guarda la respuesta de Claude para reutilizarla si el prompt se repite"""
+    try:
+        supabase = get_supabase_manager()
+        return supabase.save_cached_report(prompt_hash, CHANNEL_ID, analysis)
+    except Exception as e:
+        print(f"⚠️  No se pudo guardar el cache de reportes: {e}")
+        return False
+
 def get_channel_baseline(channel_id, days=30):
     """Obtiene baseline histórico del canal desde Supabase"""
     try:
@@ -7,11 +7,14 @@ import sqlite3
 import json
 from datetime import datetime
 from dotenv import load_dotenv
-from database import get_db_manager, init_database
+from supabase_client import get_supabase_manager, init_supabase
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Filas por lote: se leen de SQLite y se suben a Supabase de a MIGRATION_BATCH_SIZE
+MIGRATION_BATCH_SIZE = 1000
+
 def migrate_sqlite_to_supabase():
     """Migra datos de SQLite local a Supabase"""
     print("🚀 Iniciando migración de SQLite a Supabase...")
@@ -25,8 +28,9 @@ def migrate_sqlite_to_supabase():
     # 2. Inicializar Supabase
     print("📡 Conectando a Supabase...")
     try:
-        init_database()
-        db = get_db_manager()
+        if not init_supabase():
+            raise RuntimeError("init_supabase falló")
+        db = get_supabase_manager()
         print("✅ Conexión a Supabase establecida")
     except Exception as e:
         print(f"❌ Error conectando a Supabase: {e}")
@@ -45,27 +49,30 @@ def migrate_sqlite_to_supabase():
     # 4. Migrar mensajes
     print("📨 Migrando mensajes...")
     try:
-        sqlite_cursor.execute("SELECT id, user_id, text, timestamp, processed FROM messages")
-        messages = sqlite_cursor.fetchall()
-        
+        sqlite_cursor.execute("SELECT id, user_id, text, timestamp FROM messages")
+
+        # Un upsert por lote en vez de un INSERT por fila; fetchmany acota la memoria
         migrated_count = 0
-        for msg in messages:
-            message_id, user_id, text, timestamp, processed = msg
-            
-            # Guardar en Supabase
-            success = db.save_message(message_id, user_id, text or '', timestamp)
-            if success:
-                migrated_count += 1
-        
+        while True:
+            rows = sqlite_cursor.fetchmany(MIGRATION_BATCH_SIZE)
+            if not rows:
+                break
+
+            batch = [
+                {'ts': message_id, 'user': user_id, 'text': text or '', 'timestamp': timestamp}
+                for message_id, user_id, text, timestamp in rows
+            ]
+            migrated_count += db.save_messages_batch(batch)
+            print(f"   ... {migrated_count} mensajes migrados")
+
         print(f"✅ Migrados {migrated_count} mensajes a Supabase")
         
     except Exception as e:
         print(f"❌ Error migrando mensajes: {e}")
         return False
     
-    # 5. Cerrar conexiones
+    # 5. Cerrar conexiones (el cliente de Supabase es HTTP, no hay conexión que cerrar)
     sqlite_conn.close()
-    db.close()
     
     print("🎉 Migración completada exitosamente!")
     print("\n📋 Próximos pasos:")
@@ -81,28 +88,19 @@ def verify_migration():
     print("\n🔍 Verificando migración...")
     
     try:
-        db = get_db_manager()
-        
-        # Contar mensajes en Supabase
-        query = "SELECT COUNT(*) FROM messages"
-        with db.connection.begin():
-            result = db.connection.execute(query)
-            count = result.scalar()
-        
-        print(f"✅ Mensajes en Supabase: {count}")
-        
-        # Mostrar algunos mensajes de ejemplo
-        query = "SELECT id, user_id, text, timestamp FROM messages ORDER BY timestamp DESC LIMIT 5"
-        with db.connection.begin():
-            result = db.connection.execute(query)
-            messages = result.fetchall()
-        
+        db = get_supabase_manager()
+
+        # Total y últimos 5 mensajes en una sola consulta (count="exact" viaja junto a las filas)
+        result = db.client.table("slack-channel-project-update").select(
+            "message_id, user_id, text, timestamp", count="exact"
+        ).order("timestamp", desc=True).limit(5).execute()
+
+        print(f"✅ Mensajes en Supabase: {result.count}")
+
         print("\n📋 Últimos 5 mensajes migrados:")
-        for msg in messages:
-            message_id, user_id, text, timestamp = msg
-            print(f"  • {user_id}: {text[:50]}... ({datetime.fromtimestamp(timestamp)})")
-        
-        db.close()
+        for msg in result.data:
+            print(f"  • {msg['user_id']}: {(msg['text'] or '')[:50]}... ({msg['timestamp']})")
+
         return True
         
     except Exception as e:
@@ -116,7 +114,7 @@ def main():
     print("=" * 60)
     
     # Verificar variables de entorno
-    required_vars = ['DATABASE_URL', 'DB_HOST', 'DB_PASSWORD']
+    required_vars = ['SUPABASE_URL', 'SUPABASE_SERVICE_ROLE_KEY']
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     
     if missing_vars:
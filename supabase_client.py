@@ -1,11 +1,22 @@
 """
 Módulo de gestión de base de datos para Pulse usando Cliente de Supabase
 Reemplaza psycopg2 con el cliente oficial de Supabase
+
+Las consultas por canal y fecha dependen de los índices idx_channel_timestamp
+e idx_channel_user_timestamp (ver supabase_schema.sql); no eliminarlos.
 """
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+import atexit
+import threading
+import time
+from contextvars import ContextVar, copy_context
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Any, Iterator
+import httpx
 from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
+from postgrest.exceptions import APIError
 from dotenv import load_dotenv
 import logging
 
@@ -16,12 +27,87 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Hora de la corrida en curso (la fija el pipeline al arrancar); sin ella, la hora actual
+_now_var: ContextVar[Optional[datetime]] = ContextVar("pulse_now", default=None)
+
+def _now() -> datetime:
+    return _now_var.get() or datetime.now()
+
+def set_report_clock(now: datetime) -> None:
+    """Fija la hora de referencia de las consultas de esta corrida"""
+    _now_var.set(now)
+
+def submit_with_report_clock(executor, fn, *args, **kwargs):
+    """executor.submit que conserva la hora de la corrida (los hilos del pool no heredan el contexto)"""
+    return executor.submit(copy_context().run, fn, *args, **kwargs)
+
+def _iso_utc(timestamp: float) -> str:
+    """Epoch (ts de Slack) -> ISO 8601 con zona UTC explícita para columnas TIMESTAMPTZ"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+@lru_cache(maxsize=64)
+def business_days_offset(weekday: int, days: int) -> int:
+    """Días de calendario hacia atrás que cubren los últimos N días hábiles (lunes-viernes, sin contar hoy)"""
+    if days <= 0:
+        return 0
+
+    # El primero es el último día hábil antes de hoy: ayer, o el viernes si hoy es domingo o lunes
+    offset = 3 if weekday == 0 else 2 if weekday == 6 else 1
+    last_weekday = (weekday - offset) % 7
+    # Faltan days-1 días hábiles hacia atrás desde ese día
+    full_weeks, extra = divmod(days - 1, 5)
+    return offset + full_weeks * 7 + extra + (2 if extra > last_weekday else 0)
+
+def slack_display_name(user: Dict[str, Any]) -> str:
+    """Nombre visible de un usuario de Slack (real_name, o display_name para bots)"""
+    profile = user.get('profile', {})
+    if user.get('is_bot'):
+        return profile.get('display_name') or profile.get('real_name') or 'Bot'
+    return user.get('real_name') or profile.get('real_name') or user.get('name') or user['id']
+
+def slack_user_row(user: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fila de "slack-users" para un usuario de users.list/users.info; None si fue eliminado (no se persiste)"""
+    if user.get('deleted'):
+        return None
+    return {
+        'user_id': user['id'],
+        'real_name': slack_display_name(user),
+        'username': user.get('name', user['id']),
+        'is_bot': user.get('is_bot', False)
+    }
+
 class SupabaseManager:
     """Gestor de base de datos usando Cliente de Supabase"""
+
+    # Filas máximas por upsert (evita pegarle al límite de payload de PostgREST)
+    UPSERT_CHUNK_SIZE = 10000
+
+    # Pool HTTP hacia PostgREST: conexiones vivas entre consultas y reintento de conexión
+    HTTP_TIMEOUT_SECONDS = 30
+    HTTP_LIMITS = httpx.Limits(max_connections=60, max_keepalive_connections=40, keepalive_expiry=60.0)
+    HTTP_CONNECT_RETRIES = 3
+
+    # message_ids por UPDATE ... IN (...): el filtro viaja en la URL, así que se acota
+    MARK_CHUNK_SIZE = 200
+
+    # Vigencia de get_messages en memoria (se invalida al guardar mensajes)
+    MESSAGES_CACHE_TTL_SECONDS = 3600
+    # Códigos de PostgREST para una función SQL que no existe (sin cuerpo JSON llega el status 404)
+    MISSING_RPC_CODES = ("PGRST202", 404)
     
     def __init__(self):
         self.client: Client = None
+        # Mensajes de save_message pendientes de subir en lote
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_lock = threading.Lock()
+        self._batch_size = int(os.getenv('PULSE_BATCH_SIZE', '1000'))
+        # Funciones SQL (RPC) que fallaron: no se reintentan, se usa la consulta directa
+        self._missing_rpcs = set()
+        # (channel_id, días, fecha) -> (expira_en según time.monotonic(), mensajes)
+        self._messages_cache = {}
         self._connect()
+        # Lo que quede en cola se sube al terminar el proceso
+        atexit.register(self._flush_at_exit)
     
     def _connect(self):
         """Establece conexión con Supabase usando el cliente oficial"""
@@ -32,71 +118,144 @@ class SupabaseManager:
             if not url or not service_key:
                 raise ValueError("SUPABASE_URL y SUPABASE_SERVICE_ROLE_KEY son requeridos")
             
-            self.client = create_client(url, service_key)
+            self.client = create_client(
+                url, service_key,
+                options=ClientOptions(postgrest_client_timeout=self.HTTP_TIMEOUT_SECONDS)
+            )
+            self._tune_postgrest_pool()
+            # Constructores de tabla reutilizables (sin estado: cada select/upsert arma su propia consulta)
+            self._msgs_table = self.client.table("slack-channel-project-update")
+            self._reports_table = self.client.table("daily-analysis")
+            self._users_table = self.client.table("slack-users")
+            self._report_cache_table = self.client.table("report-cache")
+            # Canal del proyecto, leído una vez (se usa en cada fila guardada)
+            self.channel_id = os.getenv('PROJECT_CHANNEL_ID')
             logger.info("✅ Conexión a Supabase establecida con cliente oficial")
             
         except Exception as e:
             logger.error(f"❌ Error conectando a Supabase: {e}")
             raise
     
+    def _tune_postgrest_pool(self):
+        """
+        Reemplaza la sesión httpx de PostgREST por una con pool y keepalive más amplios
+        (supabase-py no permite pasar un cliente httpx propio en ClientOptions).
+        """
+        postgrest = self.client.postgrest
+        default_session = postgrest.session
+        postgrest.session = httpx.Client(
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            timeout=default_session.timeout,
+            follow_redirects=True,
+            transport=httpx.HTTPTransport(
+                http2=True,
+                limits=self.HTTP_LIMITS,
+                retries=self.HTTP_CONNECT_RETRIES
+            )
+        )
+        default_session.close()
+
     def save_message(self, message_id: str, user_id: str, text: str, timestamp: float,
                     thread_ts: str = None, reply_count: int = 0) -> bool:
-        """Guarda un mensaje en la base de datos"""
+        """
+        Encola un mensaje; se sube en lote cada PULSE_BATCH_SIZE mensajes (o con flush()).
+        True solo indica que quedó encolado: el guardado lo confirma flush(). False si no se
+        pudo encolar o si falló el lote que este mensaje disparó.
+        """
         try:
-            # Convertir timestamp a datetime
-            message_datetime = datetime.fromtimestamp(timestamp)
-
             data = {
                 "message_id": message_id,
-                "channel_id": os.getenv('PROJECT_CHANNEL_ID'),
+                "channel_id": self.channel_id,
                 "user_id": user_id,
                 "text": text,
-                "timestamp": message_datetime.isoformat(),
+                "timestamp": _iso_utc(timestamp),
                 "thread_ts": thread_ts,
                 "reply_count": reply_count
             }
             
-            # Insertar usando upsert para evitar duplicados
-            result = self.client.table("slack-channel-project-update").upsert(
-                data, 
-                on_conflict="message_id"
-            ).execute()
-            
-            return len(result.data) > 0
+            with self._pending_lock:
+                self._pending.append(data)
+                should_flush = len(self._pending) >= self._batch_size
+
+            if should_flush:
+                return self.flush() > 0
+            return True
             
         except Exception as e:
             logger.error(f"❌ Error guardando mensaje {message_id}: {e}")
             return False
+
+    def flush(self) -> int:
+        """Sube los mensajes encolados por save_message; retorna cuántos se guardaron (si falla, siguen en cola)"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+
+        if not pending:
+            return 0
+
+        try:
+            # Un mismo message_id dos veces en un upsert hace fallar a Postgres: gana el último
+            rows = list({row['message_id']: row for row in pending}.values())
+            return self._upsert_messages(rows)
+
+        except Exception as e:
+            # Vuelven al frente de la cola (el upsert es idempotente): el próximo flush los reintenta
+            with self._pending_lock:
+                self._pending[:0] = pending
+            logger.error(f"❌ Error subiendo {len(pending)} mensajes encolados (siguen en cola): {e}")
+            return 0
+
+    def _flush_at_exit(self):
+        """flush() al terminar el proceso: nadie ve su resultado, así que lo que no se subió se reporta"""
+        self.flush()
+        if self._pending:
+            logger.error(f"❌ {len(self._pending)} mensajes encolados no se pudieron guardar en Supabase")
+
+    def _upsert_messages(self, rows: List[Dict[str, Any]]) -> int:
+        """Upsert de filas de mensajes en tramos de UPSERT_CHUNK_SIZE"""
+        saved_count = 0
+        try:
+            for start in range(0, len(rows), self.UPSERT_CHUNK_SIZE):
+                result = self._msgs_table.upsert(
+                    rows[start:start + self.UPSERT_CHUNK_SIZE],
+                    on_conflict="message_id"
+                ).execute()
+                saved_count += len(result.data)
+        finally:
+            # Aunque falle un tramo, los anteriores ya quedaron escritos
+            if saved_count:
+                self.invalidate_messages_cache()
+        return saved_count
+
+    def invalidate_messages_cache(self):
+        """Descarta los resultados de get_messages en memoria (tras guardar mensajes nuevos)"""
+        self._messages_cache.clear()
     
     def save_messages_batch(self, messages: List[Dict[str, Any]]) -> int:
         """Guarda múltiples mensajes en lote"""
         try:
             saved_count = 0
-            batch_data = []
-            
-            for msg in messages:
-                if 'user' in msg:  # Solo mensajes de usuarios reales
-                    message_datetime = datetime.fromtimestamp(float(msg['ts']))
-
-                    data = {
-                        "message_id": msg['ts'],
-                        "channel_id": os.getenv('PROJECT_CHANNEL_ID'),
-                        "user_id": msg['user'],
-                        "text": msg.get('text', ''),
-                        "timestamp": message_datetime.isoformat(),
-                        "thread_ts": msg.get('thread_ts'),
-                        "reply_count": msg.get('reply_count', 0)
-                    }
-                    batch_data.append(data)
+            channel_id = self.channel_id
+
+            # Solo mensajes de usuarios reales; 'timestamp' explícito (p.ej. filas migradas)
+            # o, si no, el ts de Slack
+            batch_data = [
+                {
+                    "message_id": msg['ts'],
+                    "channel_id": channel_id,
+                    "user_id": msg['user'],
+                    "text": msg.get('text', ''),
+                    "timestamp": _iso_utc(float(msg.get('timestamp', msg['ts']))),
+                    "thread_ts": msg.get('thread_ts'),
+                    "reply_count": msg.get('reply_count', 0)
+                }
+                for msg in messages if 'user' in msg
+            ]
             
             if batch_data:
-                # Insertar en lote usando upsert
-                result = self.client.table("slack-channel-project-update").upsert(
-                    batch_data,
-                    on_conflict="message_id"
-                ).execute()
-                
-                saved_count = len(result.data)
+                # Insertar en lote usando upsert (en tramos si el lote es muy grande)
+                saved_count = self._upsert_messages(batch_data)
             
             logger.info(f"💾 Guardados {saved_count} mensajes en Supabase")
             return saved_count
@@ -105,44 +264,71 @@ class SupabaseManager:
             logger.error(f"❌ Error guardando mensajes en lote: {e}")
             return 0
     
-    def get_messages(self, channel_id: str, days: int = 10) -> List[Dict[str, Any]]:
-        """Obtiene mensajes de los últimos N días hábiles"""
-        try:
-            # Calcular fecha de inicio
-            current_date = datetime.now()
-            business_days_count = 0
-            
-            while business_days_count < days:
-                current_date -= timedelta(days=1)
-                if current_date.weekday() < 5:  # Lunes a viernes
-                    business_days_count += 1
-            
-            start_datetime = current_date.isoformat()
-            
-            # Consultar mensajes usando el cliente de Supabase
-            result = self.client.table("slack-channel-project-update").select(
-                "message_id, user_id, text, timestamp, thread_ts, reply_count"
-            ).eq("channel_id", channel_id).gte("timestamp", start_datetime).order(
-                "timestamp", desc=True
-            ).execute()
-            
-            # Convertir a formato esperado por el resto del código
-            messages = []
+    def iter_messages(self, channel_id: str, days: int = 10,
+                      page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Recorre los mensajes de los últimos N días hábiles página a página vía .range() (RPC get_recent_messages)"""
+        now = _now()
+        # Calcular fecha de inicio (aritmética cerrada, cacheada por día de la semana)
+        start_datetime = (now - timedelta(days=business_days_offset(now.weekday(), days))).isoformat()
+
+        columns = "message_id, user_id, text, timestamp, thread_ts, reply_count"
+        use_rpc = "get_recent_messages" not in self._missing_rpcs
+        offset = 0
+        while True:
+            if use_rpc:
+                query = self.client.rpc(
+                    "get_recent_messages", {"p_channel": channel_id, "p_since": start_datetime}
+                ).select(columns)
+            else:
+                # message_id desempata timestamps iguales para que las páginas no se solapen
+                query = self._msgs_table.select(
+                    columns
+                ).eq("channel_id", channel_id).gte("timestamp", start_datetime).order(
+                    "timestamp", desc=True
+                ).order("message_id", desc=True)
+
+            try:
+                result = query.range(offset, offset + page_size - 1).execute()
+            except Exception as e:
+                # Si falla la RPC se repite la primera página con la consulta directa; solo se
+                # deja de usar para siempre si la función no está desplegada (no ante un timeout o 5xx)
+                if not use_rpc or offset:
+                    raise
+                if self._is_missing_rpc(e):
+                    logger.warning(f"⚠️  RPC get_recent_messages no disponible, usando consulta directa: {e}")
+                    self._missing_rpcs.add("get_recent_messages")
+                else:
+                    logger.warning(f"⚠️  RPC get_recent_messages falló, usando consulta directa esta vez: {e}")
+                use_rpc = False
+                continue
+
+            # Convertir a formato esperado por el resto del código (timestamp de vuelta a formato Slack)
             for row in result.data:
-                # Convertir timestamp de vuelta a formato Slack
-                timestamp_dt = datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00'))
-                timestamp_float = timestamp_dt.timestamp()
-                
-                messages.append({
+                yield {
                     'ts': row['message_id'],
                     'user': row['user_id'],
                     'text': row['text'] or '',
-                    'timestamp': timestamp_float,
+                    'timestamp': datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00')).timestamp(),
                     'thread_ts': row.get('thread_ts'),
                     'reply_count': row.get('reply_count', 0)
-                })
-            
+                }
+
+            if len(result.data) < page_size:
+                break
+            offset += page_size
+
+    def get_messages(self, channel_id: str, days: int = 10) -> List[Dict[str, Any]]:
+        """Obtiene mensajes de los últimos N días hábiles (cacheados por canal y día)"""
+        cache_key = (channel_id, days, _now().date())
+        cached = self._messages_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        try:
+            messages = list(self.iter_messages(channel_id, days))
+
             logger.info(f"📨 Obtenidos {len(messages)} mensajes de los últimos {days} días hábiles")
+            self._messages_cache[cache_key] = (time.monotonic() + self.MESSAGES_CACHE_TTL_SECONDS, messages)
             return messages
             
         except Exception as e:
@@ -154,7 +340,7 @@ class SupabaseManager:
         try:
             data = {
                 "channel_id": channel_id,
-                "analysis_date": datetime.now().date().isoformat(),
+                "analysis_date": _now().date().isoformat(),
                 "total_messages": report_data.get('total_messages', 0),
                 "active_users": report_data.get('active_users', 0),
                 "updates_count": report_data.get('updates_count', 0),
@@ -167,7 +353,7 @@ class SupabaseManager:
                 "report_sent": report_data.get('report_sent', False)
             }
             
-            result = self.client.table("daily-analysis").upsert(
+            result = self._reports_table.upsert(
                 data,
                 on_conflict="channel_id,analysis_date"
             ).execute()
@@ -179,16 +365,48 @@ class SupabaseManager:
             logger.error(f"❌ Error guardando reporte: {e}")
             return False
     
+    @classmethod
+    def _is_missing_rpc(cls, error: Exception) -> bool:
+        """True si PostgREST respondió que la función no existe"""
+        return isinstance(error, APIError) and error.code in cls.MISSING_RPC_CODES
+
+    def _rpc(self, fn: str, params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Ejecuta una función SQL; None si no está desplegada (o falla) para usar la consulta directa"""
+        if fn in self._missing_rpcs:
+            return None
+
+        try:
+            return self.client.rpc(fn, params).execute().data or []
+        except Exception as e:
+            # Solo una función inexistente se descarta para siempre; un timeout o 5xx afecta esta llamada
+            if self._is_missing_rpc(e):
+                logger.warning(f"⚠️  RPC {fn} no disponible, usando consulta directa: {e}")
+                self._missing_rpcs.add(fn)
+            else:
+                logger.warning(f"⚠️  RPC {fn} falló, usando consulta directa esta vez: {e}")
+            return None
+
     def get_user_baseline(self, user_id: str, channel_id: str, days: int = 30) -> Optional[Dict[str, Any]]:
-        """Obtiene baseline histórico de un usuario"""
+        """Obtiene baseline histórico de un usuario (agregado en Postgres vía RPC user_baseline)"""
+        rows = self._rpc("user_baseline", {"p_channel": channel_id, "p_user": user_id, "p_days": days})
+        if rows is None:
+            return self._get_user_baseline_from_rows(user_id, channel_id, days)
+
+        if not rows or not rows[0]['total_messages']:
+            return None
+        return self._baseline_metrics(rows[0]['total_messages'], rows[0]['days_active'], days)
+
+    def _get_user_baseline_from_rows(self, user_id: str, channel_id: str, days: int) -> Optional[Dict[str, Any]]:
+        """Baseline de un usuario contando en Python (si la función SQL no está desplegada)"""
         try:
             # Calcular fecha de inicio
-            start_date = datetime.now() - timedelta(days=days)
+            start_date = _now() - timedelta(days=days)
             start_datetime = start_date.isoformat()
             
-            # Consultar mensajes del usuario en el período
-            result = self.client.table("slack-channel-project-update").select(
-                "timestamp"
+            # Consultar mensajes del usuario en el período; count="exact" trae el total real
+            # en la misma respuesta aunque PostgREST corte las filas en max-rows
+            result = self._msgs_table.select(
+                "timestamp", count="exact"
             ).eq("channel_id", channel_id).eq("user_id", user_id).gte(
                 "timestamp", start_datetime
             ).execute()
@@ -196,46 +414,189 @@ class SupabaseManager:
             if not result.data:
                 return None
             
-            # Calcular métricas
-            total_messages = len(result.data)
+            # Contar días únicos: el ISO de Supabase empieza con YYYY-MM-DD, no hace falta parsearlo
+            unique_days = {row['timestamp'][:10] for row in result.data}
             
-            # Contar días únicos
-            unique_days = set()
-            for row in result.data:
-                timestamp_dt = datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00'))
-                unique_days.add(timestamp_dt.date())
-            
-            days_active = len(unique_days)
-            avg_messages_per_day = total_messages / days if days > 0 else 0
-            
-            return {
-                'total_messages': total_messages,
-                'days_active': days_active,
-                'avg_messages_per_day': round(avg_messages_per_day, 2),
-                'participation_rate': round((days_active / days) * 100, 1)
-            }
+            total_messages = result.count if result.count is not None else len(result.data)
+            return self._baseline_metrics(total_messages, len(unique_days), days)
             
         except Exception as e:
             logger.error(f"❌ Error obteniendo baseline de usuario {user_id}: {e}")
             return None
     
-    def mark_message_as_update(self, message_id: str) -> bool:
-        """Marca un mensaje como update del proyecto"""
+    def get_user_baselines_batch(self, user_ids: Optional[List[str]], channel_id: str, days: int = 30,
+                                 page_size: int = 1000) -> Dict[str, Dict[str, Any]]:
+        """
+        Obtiene baselines de varios usuarios (None = todos los del canal) en una sola llamada:
+        GROUP BY en Postgres vía RPC user_baselines, o consulta paginada si no está desplegada.
+        """
+        if user_ids is not None and not user_ids:
+            return {}
+
+        rows = self._rpc("user_baselines", {
+            "p_channel": channel_id,
+            "p_user_ids": list(user_ids) if user_ids is not None else None,
+            "p_days": days
+        })
+        if rows is None:
+            return self._get_user_baselines_from_rows(user_ids, channel_id, days, page_size)
+
+        return {
+            row['user_id']: self._baseline_metrics(row['total_messages'], row['days_active'], days)
+            for row in rows
+        }
+
+    def _get_user_baselines_from_rows(self, user_ids: Optional[List[str]], channel_id: str, days: int,
+                                      page_size: int) -> Dict[str, Dict[str, Any]]:
+        """Baselines de varios usuarios contando en Python, paginando por .range()"""
         try:
-            result = self.client.table("slack-channel-project-update").update(
-                {"is_update": True}
-            ).eq("message_id", message_id).execute()
-            
+            start_datetime = (_now() - timedelta(days=days)).isoformat()
+
+            # user_id -> [total de mensajes, días únicos]
+            per_user = {}
+            offset = 0
+            while True:
+                query = self._msgs_table.select(
+                    "user_id, timestamp"
+                ).eq("channel_id", channel_id)
+                if user_ids is not None:
+                    query = query.in_("user_id", list(user_ids))
+                result = query.gte(
+                    "timestamp", start_datetime
+                ).range(offset, offset + page_size - 1).execute()
+
+                for row in result.data:
+                    counts = per_user.setdefault(row['user_id'], [0, set()])
+                    counts[0] += 1
+                    counts[1].add(row['timestamp'][:10])  # YYYY-MM-DD
+
+                if len(result.data) < page_size:
+                    break
+                offset += page_size
+
+            return {
+                user_id: self._baseline_metrics(total_messages, len(unique_days), days)
+                for user_id, (total_messages, unique_days) in per_user.items()
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo baselines de usuarios: {e}")
+            return {}
+
+    @staticmethod
+    def _baseline_metrics(total_messages: int, days_active: int, days: int) -> Dict[str, Any]:
+        """Métricas de baseline a partir de mensajes y días activos en el período"""
+        avg_messages_per_day = total_messages / days if days > 0 else 0
+
+        return {
+            'total_messages': total_messages,
+            'days_active': days_active,
+            'avg_messages_per_day': round(avg_messages_per_day, 2),
+            'participation_rate': round((days_active / days) * 100, 1)
+        }
+
+    def save_users_batch(self, users: List[Dict[str, Any]]) -> int:
+        """Guarda (o refresca) usuarios de Slack en lote"""
+        try:
+            if not users:
+                return 0
+
+            result = self._users_table.upsert(
+                users,
+                on_conflict="user_id"
+            ).execute()
+
+            return len(result.data)
+
+        except Exception as e:
+            logger.error(f"❌ Error guardando usuarios: {e}")
+            return 0
+
+    def get_recent_users(self, max_age_minutes: int = 10) -> List[Dict[str, Any]]:
+        """Obtiene usuarios refrescados en los últimos N minutos (cache persistente entre ejecuciones)"""
+        try:
+            since = (_now().astimezone(timezone.utc) - timedelta(minutes=max_age_minutes)).isoformat()
+
+            result = self._users_table.select(
+                "user_id, real_name, username, is_bot"
+            ).gte("updated_at", since).execute()
+
+            return result.data or []
+
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo usuarios: {e}")
+            return []
+
+    def get_cached_report(self, prompt_hash: str, max_age_minutes: int = 60) -> Optional[str]:
+        """Obtiene la respuesta de Claude guardada para el mismo prompt en los últimos N minutos"""
+        try:
+            since = (_now().astimezone(timezone.utc) - timedelta(minutes=max_age_minutes)).isoformat()
+
+            result = self._report_cache_table.select(
+                "response"
+            ).eq("prompt_hash", prompt_hash).gte("created_at", since).limit(1).execute()
+
+            return result.data[0]['response'] if result.data else None
+
+        except Exception as e:
+            logger.error(f"❌ Error leyendo cache de reportes: {e}")
+            return None
+
+    def save_cached_report(self, prompt_hash: str, channel_id: str, response: str) -> bool:
+        """Guarda (o refresca) la respuesta de Claude para un prompt"""
+        try:
+            result = self._report_cache_table.upsert(
+                {
+                    "prompt_hash": prompt_hash,
+                    "channel_id": channel_id,
+                    "response": response,
+                    "created_at": _now().astimezone(timezone.utc).isoformat()
+                },
+                on_conflict="prompt_hash"
+            ).execute()
+
             return len(result.data) > 0
-            
+
         except Exception as e:
-            logger.error(f"❌ Error marcando mensaje como update: {e}")
+            logger.error(f"❌ Error guardando cache de reportes: {e}")
             return False
+
+    def mark_messages_bulk(self, updates: List[Dict[str, Any]]) -> int:
+        """
+        Aplica varias marcas de mensajes ([{"message_id": ..., "is_update": True, ...}, ...])
+        con un UPDATE por combinación de valores en vez de uno por mensaje.
+        Retorna cuántas filas se actualizaron.
+        """
+        try:
+            # Agrupar message_ids por los valores a escribir (p.ej. todos los is_update=True juntos)
+            ids_by_values = {}
+            for update in updates:
+                values = tuple(sorted((k, v) for k, v in update.items() if k != 'message_id'))
+                if values:
+                    ids_by_values.setdefault(values, []).append(update['message_id'])
+
+            updated_count = 0
+            for values, message_ids in ids_by_values.items():
+                for start in range(0, len(message_ids), self.MARK_CHUNK_SIZE):
+                    result = self._msgs_table.update(
+                        dict(values)
+                    ).in_("message_id", message_ids[start:start + self.MARK_CHUNK_SIZE]).execute()
+                    updated_count += len(result.data)
+
+            return updated_count
+
+        except Exception as e:
+            logger.error(f"❌ Error marcando mensajes en lote: {e}")
+            return 0
+
+    def mark_message_as_update(self, message_id: str) -> bool:
+        """Marca un mensaje como update del proyecto (para varios, usar mark_messages_bulk)"""
+        return self.mark_messages_bulk([{"message_id": message_id, "is_update": True}]) > 0
     
     def mark_message_analysis(self, message_id: str, sentiment_score: float = None, 
                             urgency_level: str = None, contains_decision: bool = False, 
                             contains_blocker: bool = False) -> bool:
-        """Marca análisis de un mensaje"""
+        """Marca análisis de un mensaje (para varios, usar mark_messages_bulk)"""
         try:
             update_data = {}
             if sentiment_score is not None:
@@ -248,11 +609,7 @@ class SupabaseManager:
                 update_data['contains_blocker'] = contains_blocker
             
             if update_data:
-                result = self.client.table("slack-channel-project-update").update(
-                    update_data
-                ).eq("message_id", message_id).execute()
-                
-                return len(result.data) > 0
+                return self.mark_messages_bulk([{"message_id": message_id, **update_data}]) > 0
             
             return False
             
@@ -260,15 +617,10 @@ class SupabaseManager:
             logger.error(f"❌ Error marcando análisis de mensaje: {e}")
             return False
 
-# Instancia global del gestor de Supabase
-supabase_manager = None
-
+@lru_cache(maxsize=1)
 def get_supabase_manager() -> SupabaseManager:
-    """Obtiene la instancia global del gestor de Supabase"""
-    global supabase_manager
-    if supabase_manager is None:
-        supabase_manager = SupabaseManager()
-    return supabase_manager
+    """Obtiene la instancia global del gestor de Supabase (se crea una sola vez por proceso)"""
+    return SupabaseManager()
 
 def init_supabase():
     """Inicializa la conexión a Supabase"""
@@ -37,8 +37,10 @@ CREATE INDEX idx_urgency_level ON "slack-channel-project-update"(urgency_level);
 CREATE INDEX idx_contains_decision ON "slack-channel-project-update"(contains_decision);
 CREATE INDEX idx_contains_blocker ON "slack-channel-project-update"(contains_blocker);
 
--- Índice compuesto para consultas frecuentes
+-- Índices compuestos para consultas frecuentes (get_messages / baselines por usuario)
+-- En una base ya existente crearlos con CREATE INDEX CONCURRENTLY para no bloquear escrituras
 CREATE INDEX idx_channel_timestamp ON "slack-channel-project-update"(channel_id, timestamp DESC);
+CREATE INDEX idx_channel_user_timestamp ON "slack-channel-project-update"(channel_id, user_id, timestamp DESC);
 
 -- =============================================================================
 -- TABLA DE USUARIOS
@@ -154,6 +156,19 @@ INSERT INTO "pulse-config" (config_key, config_value, description) VALUES
 ('urgency_keywords', 'urgente,critical,deadline,cliente', 'Palabras clave de urgencia'),
 ('update_keywords', 'update,actualización,progreso,avance,completado', 'Palabras clave de updates');
 
+-- =============================================================================
+-- CACHE DE REPORTES DE CLAUDE
+-- =============================================================================
+
+CREATE TABLE "report-cache" (
+  prompt_hash TEXT PRIMARY KEY, -- blake2b del prompt completo
+  channel_id TEXT NOT NULL,
+  response TEXT NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_report_cache_created ON "report-cache"(created_at DESC);
+
 -- =============================================================================
 -- FUNCIONES Y TRIGGERS
 -- =============================================================================
@@ -184,6 +199,41 @@ CREATE TRIGGER update_pulse_config_updated_at
     BEFORE UPDATE ON "pulse-config" 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- =============================================================================
+-- FUNCIONES DE BASELINE (RPC)
+-- =============================================================================
+
+-- Baseline de un usuario: total de mensajes y días activos en una sola fila
+CREATE OR REPLACE FUNCTION user_baseline(p_channel TEXT, p_user TEXT, p_days INTEGER)
+RETURNS TABLE(total_messages INTEGER, days_active INTEGER) AS $$
+    SELECT COUNT(*)::INTEGER, COUNT(DISTINCT timestamp::date)::INTEGER
+    FROM "slack-channel-project-update"
+    WHERE channel_id = p_channel
+      AND user_id = p_user
+      AND timestamp >= NOW() - make_interval(days => p_days)
+$$ LANGUAGE sql STABLE;
+
+-- Baselines de varios usuarios (o de todo el canal si p_user_ids es NULL), una fila por usuario
+CREATE OR REPLACE FUNCTION user_baselines(p_channel TEXT, p_user_ids TEXT[], p_days INTEGER)
+RETURNS TABLE(user_id TEXT, total_messages INTEGER, days_active INTEGER) AS $$
+    SELECT m.user_id, COUNT(*)::INTEGER, COUNT(DISTINCT m.timestamp::date)::INTEGER
+    FROM "slack-channel-project-update" m
+    WHERE m.channel_id = p_channel
+      AND (p_user_ids IS NULL OR m.user_id = ANY(p_user_ids))
+      AND m.timestamp >= NOW() - make_interval(days => p_days)
+    GROUP BY m.user_id
+$$ LANGUAGE sql STABLE;
+
+-- Mensajes recientes de un canal (plan preparado para get_messages; columnas vía ?select=)
+CREATE OR REPLACE FUNCTION get_recent_messages(p_channel TEXT, p_since TIMESTAMPTZ)
+RETURNS SETOF "slack-channel-project-update" AS $$
+    SELECT *
+    FROM "slack-channel-project-update"
+    WHERE channel_id = p_channel
+      AND timestamp >= p_since
+    ORDER BY timestamp DESC, message_id DESC
+$$ LANGUAGE sql STABLE;
+
 -- =============================================================================
 -- VISTAS ÚTILES
 -- =============================================================================
@@ -231,6 +281,7 @@ ALTER TABLE "slack-users" ENABLE ROW LEVEL SECURITY;
 ALTER TABLE "daily-analysis" ENABLE ROW LEVEL SECURITY;
 ALTER TABLE "user-metrics" ENABLE ROW LEVEL SECURITY;
 ALTER TABLE "pulse-config" ENABLE ROW LEVEL SECURITY;
+ALTER TABLE "report-cache" ENABLE ROW LEVEL SECURITY;
 
 -- Políticas básicas (ajustar según necesidades)
 CREATE POLICY "Allow all operations for service role" ON "slack-channel-project-update"
@@ -247,3 +298,6 @@ CREATE POLICY "Allow all operations for service role" ON "user-metrics"
 
 CREATE POLICY "Allow all operations for service role" ON "pulse-config"
     FOR ALL USING (auth.role() = 'service_role');
+
+CREATE POLICY "Allow all operations for service role" ON "report-cache"
+    FOR ALL USING (auth.role() = 'service_role');
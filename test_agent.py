@@ -3,6 +3,10 @@ Script de prueba para el sistema agéntico
 Prueba las herramientas sin necesidad de Slack
 """
 from agent_main import (
+    calculate_business_days,
+    summarize_messages,
+    enrich_messages_with_names,
+    user_cache,
     analyze_sentiment,
     detect_blockers,
     classify_urgency,
@@ -10,6 +14,7 @@ from agent_main import (
     extract_key_decisions
 )
 import json
+from datetime import datetime, timedelta
 
 def test_analyze_sentiment():
     print("\n" + "="*60)
@@ -72,6 +77,9 @@ def test_classify_urgency():
         result = classify_urgency(context)
         print(json.dumps(result, indent=2, ensure_ascii=False))
 
+    # Sin acentos se detecta igual que con acentos
+    assert classify_urgency("produccion caida")['urgency_level'] == 'crítico'
+
 
 def test_calculate_team_health():
     print("\n" + "="*60)
@@ -119,6 +127,84 @@ def test_extract_key_decisions():
     print(json.dumps(result, indent=2, ensure_ascii=False))
 
 
+def _business_days_loop(days, now):
+    """Implementación de referencia: retrocede día a día contando días hábiles"""
+    current_date = now
+    business_days_count = 1 if current_date.weekday() < 5 else 0
+    while business_days_count < days:
+        current_date -= timedelta(days=1)
+        if current_date.weekday() < 5:
+            business_days_count += 1
+    return current_date.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def test_calculate_business_days():
+    print("\n" + "="*60)
+    print("🧪 TEST 6: calculate_business_days")
+    print("="*60)
+
+    # 2024-01-01 fue lunes: cubre los 7 días de la semana
+    for offset in range(7):
+        now = datetime(2024, 1, 1, 15, 30) + timedelta(days=offset)
+        for days in range(0, 21):
+            expected = _business_days_loop(days, now)
+            assert calculate_business_days(days, now=now) == expected, (now, days)
+
+    print("✅ Fórmula cerrada equivalente al loop día a día")
+
+
+def test_enriched_messages():
+    print("\n" + "="*60)
+    print("🧪 TEST 7: enrich_messages_with_names")
+    print("="*60)
+
+    # Nombres ya en cache: no se consulta Slack
+    user_cache.update({'U1': 'Juan Pérez (@juan)', 'U2': 'Pedro López (@pedro)'})
+    raw_messages = [
+        {'user': 'U1', 'text': 'Estoy BLOQUEADO esperando que <@U2> revise el PR', 'ts': '1.0'},
+        {'subtype': 'channel_join', 'text': 'se ha unido al canal', 'ts': '2.0'},
+        {'user': 'U2', 'text': 'Ya lo reviso, te desbloqueo en 10 minutos', 'ts': '3.0'}
+    ]
+
+    enriched = enrich_messages_with_names(raw_messages)
+    assert [m.user_name for m in enriched] == ['Juan Pérez (@juan)', 'Pedro López (@pedro)']
+    # Un 'text_lower' armado por el modelo (con acentos) se ignora: se normaliza desde 'text'
+    assert analyze_sentiment([{'text': 'Es CRÍTICO', 'text_lower': 'es crítico'}]) == analyze_sentiment(['Es CRÍTICO'])
+
+    # Las herramientas dan el mismo resultado con tuplas o con dicts (JSON del agente)
+    as_dicts = [m._asdict() for m in enriched]
+    assert detect_blockers(enriched) == detect_blockers(as_dicts)
+    assert extract_key_decisions(enriched) == extract_key_decisions(as_dicts)
+    assert analyze_sentiment(enriched) == analyze_sentiment(as_dicts)
+    # También aceptan un iterable de una sola pasada
+    assert detect_blockers(iter(as_dicts)) == detect_blockers(as_dicts)
+    assert analyze_sentiment(m.text for m in enriched) == analyze_sentiment(as_dicts)
+
+    print(f"✅ {len(enriched)} mensajes enriquecidos, mismas métricas que con dicts")
+
+
+def test_summarize_messages():
+    print("\n" + "="*60)
+    print("🧪 TEST 8: summarize_messages")
+    print("="*60)
+
+    user_cache.update({'U1': 'Juan Pérez (@juan)', 'U2': 'Pedro López (@pedro)'})
+    raw_messages = [
+        {'user': 'U1', 'text': 'Estoy bloqueado esperando que <@U2> revise el PR', 'ts': '1.0'},
+        {'user': 'U2', 'text': 'Pedro López has joined the channel', 'ts': '2.0'},
+        {'user': 'U2', 'text': 'ok', 'ts': '3.0'},
+        {'user': 'U1', 'text': 'Deploy listo en staging, revisen por favor', 'ts': '4.0'}
+    ]
+
+    stats = summarize_messages(enrich_messages_with_names(raw_messages))
+    assert [m.ts for m in stats.real_messages] == ['1.0', '4.0']
+    assert stats.active_users == {'U1'}
+    assert stats.messages_per_user == {'U1': 2}
+    assert stats.collaborative_count == 1
+
+    print(f"✅ {len(stats.real_messages)} mensajes reales de {len(raw_messages)}")
+
+
 def main():
     print("\n" + "🧪"*30)
     print("PRUEBAS DEL SISTEMA AGÉNTICO")
@@ -129,6 +215,9 @@ def main():
     test_classify_urgency()
     test_calculate_team_health()
     test_extract_key_decisions()
+    test_calculate_business_days()
+    test_enriched_messages()
+    test_summarize_messages()
 
     print("\n" + "="*60)
     print("✅ TODAS LAS PRUEBAS COMPLETADAS")
@@ -1,24 +1,49 @@
+"""
+Prueba de escritura y lectura contra Supabase
+Se omite si faltan SUPABASE_URL o SUPABASE_SERVICE_ROLE_KEY
+"""
 import os
+from datetime import datetime, timezone
+
+import pytest
+from dotenv import load_dotenv
 from supabase import create_client
-from datetime import datetime
-
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-assert url and key, "Faltan SUPABASE_URL o SUPABASE_SERVICE_ROLE_KEY en .env"
-
-sb = create_client(url, key)
-
-row = {
-    "message_id": f"{datetime.utcnow().timestamp():.6f}",
-    "channel_id": os.getenv("PROJECT_CHANNEL_ID") or "C_TEST",
-    "user_id": "U_TEST",
-    "user_name": "Test User (@test)",
-    "text": "Update de prueba desde script ✅",
-    "timestamp": datetime.utcnow().isoformat() + "Z",
-    "is_update": True
-}
-
-print("Insertando...")
-print(sb.table("slack-channel-project-update").upsert(row, on_conflict="message_id").execute())
-print("Leyendo...")
-print(sb.table("slack-channel-project-update").select("*").order("timestamp", desc=True).limit(1).execute())
+
+load_dotenv()
+
+
+@pytest.fixture(scope="session")
+def sb():
+    """Cliente de Supabase compartido por todas las pruebas de la sesión"""
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not (url and key):
+        pytest.skip("Faltan SUPABASE_URL o SUPABASE_SERVICE_ROLE_KEY en .env")
+    return create_client(url, key)
+
+
+@pytest.fixture(scope="session")
+def row():
+    return {
+        "message_id": f"{datetime.now(timezone.utc).timestamp():.6f}",
+        "channel_id": os.getenv("PROJECT_CHANNEL_ID") or "C_TEST",
+        "user_id": "U_TEST",
+        "user_name": "Test User (@test)",
+        "text": "Update de prueba desde script ✅",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "is_update": True
+    }
+
+
+def test_upsert_message(sb, row):
+    print("Insertando...")
+    result = sb.table("slack-channel-project-update").upsert(row, on_conflict="message_id").execute()
+    print(result)
+    assert result.data and result.data[0]["message_id"] == row["message_id"]
+
+
+def test_read_latest_message(sb):
+    print("Leyendo...")
+    result = sb.table("slack-channel-project-update").select("*").order("timestamp", desc=True).limit(1).execute()
+    print(result)
+    assert len(result.data) == 1